@@ -1,22 +1,48 @@
+# Imported first, so the startup report covers the imports below
+from core.utils.startup import startup
+
 import aioredis
-import hashlib
-import json
-from fastapi import FastAPI, Request, UploadFile, File, HTTPException
+import asyncio
+from fastapi import FastAPI, Request, UploadFile, File, Form, HTTPException
+from fastapi.responses import (
+    JSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from app.services.preprocess import (
-    extract_text_from_docx,
-    extract_text_from_pdf,
-    get_from_file,
-    clean_text,
-)
-from core.utils.storage import upload_file_to_s3
+from core.utils import executors
+from core.utils.executors import run_inference, run_io
+from core.utils.jobs import JobQueue
+from core.utils.llm_cache import llm_cache
+from core.utils.metrics import render as render_metrics, track_request
+from core.utils.pipeline import format_server_timing
+from core.utils.profiler import PROFILER_ENABLED, profiler
+from core.utils.reuse import intermediate_cache
+from core.utils.serving import layout
+from core.utils.staging import stage_file_key, stage_upload
+from core.utils.storage import get_s3_client, upload_file_to_s3
+import functools
+import json
 import os
-import shutil
-import tempfile
+import time
+import uuid
+
+from app.services.reports import (
+    build_compliance_report,
+    build_proposal,
+    build_revision,
+    load_section_manifest,
+    result_cache,
+    stream_compliance_batch,
+    stream_proposal,
+)
+from app.services.generate_compliance.compliance_model import label_map
+from app.services.model_registry import ModelNotReadyError, registry
+from app.services.preprocess import local_answer_stats
 
-from app.services.generate_compliance.generate_compliance import generate_compliance
-from app.services.generate_proposal.generate_proposal import generate_proposal
+startup.mark("imported")
 
 # Initialize FastAPI app
 app = FastAPI()
@@ -28,8 +54,36 @@ app.mount("/static", StaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
 
 # Initialize Redis client
+REDIS_URL = os.environ.get("REDIS_URL", "redis://redis-service:6379")
 redis = None
 
+# Asynchronous generation jobs, consumed by worker.py (bound at startup)
+job_queue = None
+
+ALLOWED_EXTENSIONS = {".pdf", ".docx"}
+
+# Documents accepted by one batch request
+BATCH_MAX_DOCUMENTS = int(os.environ.get("BATCH_MAX_DOCUMENTS", "100"))
+
+# Import the pipeline libraries and load the models in the background once the server
+# is accepting traffic; set to 0 on pods that only take uploads
+PRELOAD_MODELS = os.environ.get("PRELOAD_MODELS", "1") == "1"
+
+# Libraries the generation pipelines import on first use, slowest first
+PIPELINE_MODULES = [
+    "torch",
+    "transformers",
+    "peft",
+    "llama_index.core",
+    "llama_parse",
+    "langchain_openai",
+    "langchain_core.messages",
+    "docx",
+]
+
+# Background preload started at startup, if any
+preload_task = None
+
 
 async def get_redis():
     return redis
@@ -37,14 +91,130 @@ async def get_redis():
 
 @app.on_event("startup")
 async def startup_event():
-    global redis
-    redis = await aioredis.from_url("redis://redis-service:6379", decode_responses=True)
-    # redis = await aioredis.from_url("redis://localhost:6379", decode_responses=True)
+    global redis, job_queue, preload_task
+    # Cached payloads are compressed, so the connection stays binary
+    redis = await aioredis.from_url(REDIS_URL)
+    result_cache.redis = redis
+    llm_cache.redis = redis
+    intermediate_cache.redis = redis
+    job_queue = JobQueue(redis)
+
+    if PROFILER_ENABLED:
+        profiler.start()
+
+    if PRELOAD_MODELS:
+        preload_task = asyncio.ensure_future(preload())
+    startup.mark("accepting")
+
+
+def import_pipeline_modules():
+    for name in PIPELINE_MODULES:
+        try:
+            startup.import_module(name)
+        except ImportError as e:
+            print(f"Could not preload {name}: {e}")
+    get_s3_client()
+
+
+async def preload():
+    """
+    Imports the pipeline libraries, then loads and warms up the models once for the
+    life of the process. /health/ready/ reports ready when this is done.
+    """
+    # Off the event loop, so requests keep being served meanwhile
+    with startup.phase("imports"):
+        await run_io(import_pipeline_modules)
+    with startup.phase("models"):
+        await run_inference(registry.load)
+    startup.mark("ready")
+    print(f"Startup report: {json.dumps(startup.as_dict())}")
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    if preload_task is not None:
+        preload_task.cancel()
+    profiler.stop()
     await redis.close()
+    executors.shutdown()
+
+
+@app.exception_handler(ModelNotReadyError)
+async def model_not_ready_handler(request: Request, exc: ModelNotReadyError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+
+@app.get("/health/live/")
+def liveness():
+    """
+    The process is up and serving; checks nothing else, so a slow model load or a
+    Redis outage never gets the pod restarted.
+    """
+    return {"status": "ok"}
+
+
+@app.get("/health/ready/")
+async def readiness():
+    """
+    Whether this pod should receive traffic: Redis answers and, unless PRELOAD_MODELS=0,
+    the models are loaded.
+    """
+    try:
+        redis_ok = bool(await asyncio.wait_for(redis.ping(), timeout=1))
+    except Exception as e:
+        print(f"Redis is not reachable: {e}")
+        redis_ok = False
+
+    models_ok = registry.ready or not PRELOAD_MODELS
+    ready = redis_ok and models_ok
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "redis": redis_ok, "models": registry.ready},
+    )
+
+
+@app.get("/health/startup/")
+def startup_report():
+    """
+    Where this process's cold start went: milestones, phases and the slowest imports.
+    """
+    return startup.as_dict()
+
+
+@app.get("/models/status/")
+def models_status():
+    status = dict(registry.status(), serving=layout())
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+@app.get("/cache/stats/")
+def cache_stats():
+    """
+    Hit rates of the memoised chat and RAG calls, and the model time they saved, and
+    how many queries the local section extractor answered without RAG.
+    """
+    return dict(llm_cache.stats(), local_answers=local_answer_stats)
+
+
+@app.get("/metrics")
+def metrics():
+    """
+    Prometheus metrics: per-stage latency, cache hits and misses, inference batch sizes,
+    token counts and requests in progress.
+    """
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
+
+@app.get("/debug/profile/")
+def debug_profile(reset: bool = False):
+    """
+    Stacks sampled by the profiler since it started (or was last reset), in the
+    collapsed format read by flamegraph.pl and speedscope. Needs PROFILER_ENABLED=1.
+    """
+    if not profiler.running:
+        raise HTTPException(status_code=404, detail="The profiler is not enabled.")
+    return PlainTextResponse(profiler.folded(reset=reset))
 
 
 @app.get("/")
@@ -67,145 +237,353 @@ async def upload_rfp(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def get_document_name(file: UploadFile, file_key: str) -> str:
+    if file is not None:
+        return file.filename
+    if file_key:
+        return file_key
+    raise HTTPException(status_code=400, detail="Provide either a file or a file_key.")
+
+
+async def stage_document(file: UploadFile, file_key: str):
+    """
+    Stages the uploaded file, or the previously uploaded `file_key`, for parsing.
+
+    Uploads are hashed as they are read and kept in memory unless they are large;
+    documents fetched by file_key go through the local document cache, so repeat
+    generations skip the S3 download. Close the result when done with it.
+    """
+    if file is not None:
+        return await stage_upload(file)
+
+    try:
+        return await stage_file_key(file_key)
+    except get_s3_client().exceptions.NoSuchKey:
+        raise HTTPException(status_code=404, detail=f"No such file_key: {file_key}")
+
+
 @app.post("/generate/proposal/")
-async def generate_proposals(request: Request, file: UploadFile = File(...)):
+async def generate_proposals(
+    request: Request, file: UploadFile = File(None), file_key: str = Form(None)
+):
+    file_extension = os.path.splitext(get_document_name(file, file_key))[-1].lower()
 
-    # Create a temporary directory to store uploaded files
-    temp_dir = tempfile.mkdtemp()
+    # Only accept .pdf and .docx files
+    if file_extension not in ALLOWED_EXTENSIONS:
+        return {"error": "Invalid file type. Only PDF and DOCX are allowed."}
 
-    file_paths = []
+    document = await stage_document(file, file_key)
+    try:
+        with track_request("proposal"):
+            proposal, timings = await build_proposal([document], file_extension)
 
+        response = render_proposal(request, proposal)
+        if timings:
+            response.headers["Server-Timing"] = format_server_timing(timings)
+        return response
+    finally:
+        document.close()
+
+
+def sse_response(events, on_close=None):
+    """
+    Serves (event, data) pairs from `events` as a text/event-stream response.
+    """
+
+    async def body():
+        try:
+            async for event, data in events:
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            if on_close is not None:
+                on_close()
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream until it ends
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/generate/proposal/stream/")
+async def stream_proposals(file: UploadFile = File(...)):
     file_extension = os.path.splitext(file.filename)[-1].lower()
 
     # Only accept .pdf and .docx files
-    if file_extension not in {".pdf", ".docx"}:
+    if file_extension not in ALLOWED_EXTENSIONS:
         return {"error": "Invalid file type. Only PDF and DOCX are allowed."}
 
-    try:
-        # Save uploaded file to the temp directory
-        file_location = os.path.join(temp_dir, file.filename)
-        with open(file_location, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-
-        # Generate a unique key for caching
-        cache_key = hashlib.sha256((str(file) + "proposal").encode()).hexdigest()
-
-        # Check Redis cache
-        cached_data = await redis.get(cache_key)
-        if cached_data:
-            proposal = json.loads(cached_data)
-
-            return templates.TemplateResponse(
-                "proposal.html",
-                {
-                    "request": request,
-                    "executive_summary": proposal["executive_summary"],
-                    "technical_approach": proposal["technical_approach"],
-                    "budget_info": proposal["budget_info"],
-                },
-            )
+    # The staged document outlives this handler, until the stream is done
+    document = await stage_document(file, None)
+    return sse_response(
+        stream_proposal([document], file_extension), on_close=document.close
+    )
 
-        file_paths.append(file_location)
 
-        if file.filename.lower().endswith(".pdf"):
-            content = await extract_text_from_pdf(file_location)
-        elif file.filename.lower().endswith(".docx"):
-            content = await extract_text_from_docx(file_location)
+@app.get("/generate/proposal/stream/")
+async def stream_uploaded_proposal(file_key: str):
+    file_extension = os.path.splitext(file_key)[-1].lower()
+    if file_extension not in ALLOWED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Invalid file type.")
 
-        content = clean_text(content)
+    document = await stage_document(None, file_key)
+    return sse_response(
+        stream_proposal([document], file_extension), on_close=document.close
+    )
 
-        technical_requirements = await get_from_file(
-            file_paths=file_paths,
-            file_extension=file_extension,
-            option="tech",
-        )
 
-        budget_info = await get_from_file(
-            file_paths=file_paths,
-            file_extension=file_extension,
-            option="budget",
-        )
+@app.post("/generate/proposal/live/")
+async def generate_live_proposal(request: Request, file: UploadFile = File(...)):
+    """
+    Returns the proposal page straight away; it fills itself in from the event stream.
+    """
+    file_extension = os.path.splitext(file.filename)[-1].lower()
 
-        proposal = await generate_proposal(content, technical_requirements)
+    # Only accept .pdf and .docx files
+    if file_extension not in ALLOWED_EXTENSIONS:
+        return {"error": "Invalid file type. Only PDF and DOCX are allowed."}
 
-        proposal["technical_approach"] = proposal["technical_approach"].replace(
-            "\n", "<br/>"
+    # EventSource can only issue GETs, so the page streams the document back from S3
+    file_key = await upload_file_to_s3(file, prefix=f"live/{uuid.uuid4().hex}")
+
+    return templates.TemplateResponse(
+        "proposal.html",
+        {
+            "request": request,
+            "executive_summary": "",
+            "technical_approach": "",
+            "budget_info": "",
+            "stream_url": f"/generate/proposal/stream/?file_key={file_key}",
+        },
+    )
+
+
+@app.post("/generate/compliance-report/")
+async def generate_compliance_reports(
+    request: Request, file: UploadFile = File(None), file_key: str = Form(None)
+):
+    file_extension = os.path.splitext(get_document_name(file, file_key))[-1].lower()
+
+    # Only accept .pdf and .docx files
+    if file_extension not in ALLOWED_EXTENSIONS:
+        return {"error": "Invalid file type. Only PDF and DOCX are allowed."}
+
+    document = await stage_document(file, file_key)
+    try:
+        with track_request("compliance"):
+            compliance = await build_compliance_report([document], file_extension)
+
+        return render_compliance(request, compliance)
+    finally:
+        document.close()
+
+
+@app.post("/generate/compliance-report/batch/")
+async def generate_compliance_batch(
+    files: list[UploadFile] = File(None), file_keys: list[str] = Form(None)
+):
+    """
+    Compliance reports for many RFPs in one call, uploaded as `files` and/or given as
+    `file_keys` from /upload/.
+
+    Streams one JSON line per document as soon as its report is ready, in completion
+    order and tagged with its `index` in the request (files first, then file keys), then
+    a summary line with "done": true. A document that fails gets an "error" line; the
+    rest of the batch carries on.
+    """
+    sources = [(file.filename, file, None) for file in files or []] + [
+        (file_key, None, file_key) for file_key in file_keys or []
+    ]
+    if not sources:
+        raise HTTPException(status_code=400, detail="Provide files or file_keys.")
+    if len(sources) > BATCH_MAX_DOCUMENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {BATCH_MAX_DOCUMENTS} documents per batch.",
         )
 
-        proposal["budget_info"] = budget_info.replace(r"\n", "<br />")
+    async def stage(name, file, file_key):
+        if os.path.splitext(name)[-1].lower() not in ALLOWED_EXTENSIONS:
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid file type. Only PDF and DOCX are allowed.",
+            )
+        return await stage_document(file, file_key)
+
+    def staged(document):
+        async def stager():
+            if isinstance(document, Exception):
+                raise document
+            return document
 
-        # Save to Redis cache
-        await redis.set(cache_key, json.dumps(proposal), ex=3600)  # 1-hour expiration
+        return stager
+
+    # Uploads are read before responding, since the request's files are closed once
+    # this handler returns; documents given by file key are fetched while streaming
+    uploads = await asyncio.gather(
+        *[stage(*source) for source in sources if source[1] is not None],
+        return_exceptions=True,
+    )
+    stagers = [staged(document) for document in uploads] + [
+        functools.partial(stage, *source) for source in sources if source[1] is None
+    ]
+
+    async def body():
+        start = time.perf_counter()
+        failed = 0
+        with track_request("compliance_batch"):
+            async for index, outcome in stream_compliance_batch(stagers):
+                if "error" in outcome:
+                    failed += 1
+                line = dict(outcome, index=index, name=sources[index][0])
+                yield json.dumps(line) + "\n"
+        summary = {
+            "done": True,
+            "documents": len(sources),
+            "failed": failed,
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+        yield json.dumps(summary) + "\n"
+
+    return StreamingResponse(
+        body(),
+        media_type="application/x-ndjson",
+        # Keep proxies from buffering the lines until the batch ends
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-        return templates.TemplateResponse(
-            "proposal.html",
-            {
-                "request": request,
-                "executive_summary": proposal["executive_summary"],
-                "technical_approach": proposal["technical_approach"],
-                "budget_info": proposal["budget_info"],
-            },
+
+@app.post("/generate/revision/")
+async def generate_revision(
+    file: UploadFile = File(None),
+    file_key: str = Form(None),
+    kind: str = Form("compliance"),
+    previous_digest: str = Form(None),
+):
+    """
+    Proposal or compliance report (`kind`) for a revised RFP, as JSON, with which of
+    its sections changed since the version whose `digest` is `previous_digest` and
+    how much of the work was reused from earlier versions.
+
+    Only the changed sections are extracted, embedded, summarised and scored again.
+    Pass the `digest` of this response as `previous_digest` for the next revision.
+    """
+    if kind not in ("proposal", "compliance"):
+        raise HTTPException(status_code=400, detail="kind is proposal or compliance.")
+
+    file_extension = os.path.splitext(get_document_name(file, file_key))[-1].lower()
+    if file_extension not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400, detail="Invalid file type. Only PDF and DOCX are allowed."
         )
+
+    previous = None
+    if previous_digest:
+        previous = await load_section_manifest(previous_digest)
+        if previous is None:
+            raise HTTPException(
+                status_code=404, detail=f"Unknown previous_digest: {previous_digest}"
+            )
+
+    document = await stage_document(file, file_key)
+    try:
+        with track_request(f"{kind}_revision"):
+            return await build_revision([document], file_extension, kind, previous)
     finally:
-        shutil.rmtree(temp_dir, ignore_errors=True)
+        document.close()
 
 
-@app.post("/generate/compliance-report/")
-async def generate_compliance_reports(request: Request, file: UploadFile = File(...)):
-    # Create a temporary directory to store uploaded files
-    temp_dir = tempfile.mkdtemp()
+def render_proposal(request: Request, proposal: dict):
+    return templates.TemplateResponse(
+        "proposal.html",
+        {
+            "request": request,
+            "executive_summary": proposal["executive_summary"],
+            "technical_approach": proposal["technical_approach"],
+            "budget_info": proposal["budget_info"],
+        },
+    )
 
-    file_paths = []
 
+def render_compliance(request: Request, compliance: dict):
+    return templates.TemplateResponse(
+        "compliance.html",
+        {
+            "request": request,
+            "compliance": compliance["report"],
+            "windows": [
+                dict(
+                    window,
+                    score=label_map[window["label_index"]].split("\\n")[0],
+                    confidence=max(window["probabilities"]),
+                )
+                for window in compliance["windows"]
+            ],
+        },
+    )
+
+
+async def submit_job(kind: str, file: UploadFile):
     file_extension = os.path.splitext(file.filename)[-1].lower()
 
     # Only accept .pdf and .docx files
-    if file_extension not in {".pdf", ".docx"}:
+    if file_extension not in ALLOWED_EXTENSIONS:
         return {"error": "Invalid file type. Only PDF and DOCX are allowed."}
 
-    try:
-        # Save uploaded file to the temp directory
-        file_location = os.path.join(temp_dir, file.filename)
-        with open(file_location, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-
-        file_paths.append(file_location)
-
-        # Generate a unique key for caching
-        cache_key = hashlib.sha256((str(file) + "compliance").encode()).hexdigest()
-
-        # Check Redis cache
-        cached_data = await redis.get(cache_key)
-        if cached_data:
-            compliance_report = json.loads(cached_data)
-            return templates.TemplateResponse(
-                "compliance.html",
-                {
-                    "request": request,
-                    "compliance": compliance_report,
-                },
-            )
+    # Workers fetch the document from S3, so web and inference pods share no disk
+    job_id = uuid.uuid4().hex
+    file_key = await upload_file_to_s3(file, prefix=JobQueue.upload_prefix(job_id))
+    await job_queue.submit(
+        kind,
+        {"file_key": file_key, "filename": file.filename},
+        job_id=job_id,
+    )
 
-        response = await get_from_file(
-            file_paths=file_paths,
-            file_extension=file_extension,
-            option="section",
-        )
+    return JSONResponse(
+        status_code=202,
+        content={
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/jobs/{job_id}/",
+            "result_url": f"/jobs/{job_id}/result/",
+        },
+    )
+
+
+@app.post("/jobs/proposal/")
+async def submit_proposal_job(file: UploadFile = File(...)):
+    return await submit_job("proposal", file)
 
-        compliance_report = await generate_compliance(response)
-        compliance_report = compliance_report.replace(r"\n", "<br />")
 
-        # Save to Redis cache
-        await redis.set(
-            cache_key, json.dumps(compliance_report), ex=3600
-        )  # 1-hour expiration
+@app.post("/jobs/compliance-report/")
+async def submit_compliance_job(file: UploadFile = File(...)):
+    return await submit_job("compliance", file)
 
-        return templates.TemplateResponse(
-            "compliance.html",
-            {
-                "request": request,
-                "compliance": compliance_report,
-            },
+
+@app.get("/jobs/{job_id}/")
+async def get_job_status(job_id: str):
+    job = await job_queue.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/jobs/{job_id}/result/")
+async def get_job_result(request: Request, job_id: str):
+    job = await job_queue.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != "succeeded":
+        # Not finished yet (or failed): report where it is instead
+        return JSONResponse(
+            status_code=500 if job["status"] == "failed" else 202, content=job
         )
-    finally:
-        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    result = await job_queue.result(job_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Job result expired")
+
+    if job["kind"] == "proposal":
+        return render_proposal(request, result)
+    return render_compliance(request, result)
@@ -0,0 +1,103 @@
+import os
+
+# torch is imported inside the functions that use it, so importing the serving code
+# (e.g. for the web tier's routes) does not pull it in
+
+# File names of the artefacts written by export_models.py
+INT8_WEIGHTS = "model_int8.pt"
+ONNX_MODEL = "model.onnx"
+
+
+def quantize_int8(model):
+    """
+    Dynamic int8 quantisation of every Linear layer, for CPU inference.
+    """
+    import torch
+
+    return torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+
+
+def save_int8(model, tokenizer, out_dir):
+    """
+    Writes a dynamically quantised copy of `model` with its config and tokenizer.
+    """
+    import torch
+
+    os.makedirs(out_dir, exist_ok=True)
+    quantized = quantize_int8(model.eval())
+    model.config.save_pretrained(out_dir)
+    if getattr(model, "generation_config", None) is not None:
+        model.generation_config.save_pretrained(out_dir)
+    tokenizer.save_pretrained(out_dir)
+    torch.save(quantized.state_dict(), os.path.join(out_dir, INT8_WEIGHTS))
+
+
+def load_int8(model_class, path):
+    """
+    Rebuilds the quantised module structure from the saved config and loads the int8 weights.
+    """
+    import torch
+
+    config = model_class.config_class.from_pretrained(path)
+    model = quantize_int8(model_class(config).eval())
+    # The artefact is produced by export_models.py and holds packed quantised params
+    state_dict = torch.load(
+        os.path.join(path, INT8_WEIGHTS), map_location="cpu", weights_only=False
+    )
+    model.load_state_dict(state_dict)
+    return model.eval()
+
+
+def check_backend(backend, supported):
+    if backend not in supported:
+        raise ValueError(
+            f"Unknown runtime backend {backend!r}; expected one of {sorted(supported)}"
+        )
+
+
+class OnnxSequenceClassifier:
+    """
+    Runs an exported sequence classifier with ONNX Runtime behind the transformers call API.
+    """
+
+    def __init__(self, path):
+        # Optional dependency, only needed on nodes serving the onnx backend
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(path, ONNX_MODEL),
+            options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def __call__(self, **inputs):
+        import numpy as np
+        import torch
+        from transformers.modeling_outputs import SequenceClassifierOutput
+
+        feed = {
+            name: tensor.numpy().astype(np.int64)
+            for name, tensor in inputs.items()
+            if name in self.input_names
+        }
+        # Single-segment inputs: token types default to zeros as in transformers
+        if "token_type_ids" in self.input_names and "token_type_ids" not in feed:
+            feed["token_type_ids"] = np.zeros_like(feed["input_ids"])
+        (logits,) = self.session.run(["logits"], feed)
+        return SequenceClassifierOutput(logits=torch.from_numpy(logits))
+
+    def eval(self):
+        return self
+
+    def parameters(self):
+        return iter(())
+
+    def buffers(self):
+        return iter(())
@@ -0,0 +1,216 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+
+from PyPDF2 import PdfReader
+
+from core.utils.document_cache import document_cache
+from core.utils.executors import run_io, run_parse
+from core.utils.reuse import record_reuse
+from core.utils.staging import open_content
+
+# Pages extracted per process-pool task; larger batches amortise re-opening the PDF
+PAGES_PER_TASK = int(os.environ.get("EXTRACT_PAGES_PER_TASK", "8"))
+
+# Pages with fewer extracted characters than this are treated as scanned images
+OCR_MIN_CHARS = int(os.environ.get("OCR_MIN_CHARS", "16"))
+
+OCR_DPI = int(os.environ.get("OCR_DPI", "300"))
+
+# Seconds allowed for rasterising and recognising one page
+OCR_TIMEOUT = int(os.environ.get("OCR_TIMEOUT", "120"))
+
+# OCR needs poppler-utils and tesseract-ocr (installed in the Docker image)
+OCR_ENABLED = os.environ.get("OCR_ENABLED", "1") == "1" and all(
+    shutil.which(tool) for tool in ("pdftoppm", "tesseract")
+)
+
+# Bump when OCR output changes, so cached page text is not reused
+OCR_VERSION = f"ocr-1-{OCR_DPI}"
+
+# Bump when text-layer extraction changes, so cached page text is not reused
+PAGE_TEXT_VERSION = "page-1"
+
+
+def count_pages(path):
+    with open_content(path) as f:
+        return len(PdfReader(f).pages)
+
+
+def page_digest(page) -> str:
+    """
+    SHA-256 over a page's content stream and the raw data of the images it draws.
+
+    Identical pages hash the same in any document, so their OCR text is reused.
+    """
+    digest = hashlib.sha256()
+    contents = page.get_contents()
+    if contents is not None:
+        digest.update(contents.get_data())
+
+    resources = page.get("/Resources")
+    xobjects = resources.get_object().get("/XObject") if resources else None
+    if xobjects:
+        for name in sorted(xobjects.get_object()):
+            xobject = xobjects.get_object()[name].get_object()
+            digest.update(name.encode("utf-8"))
+            try:
+                digest.update(xobject.get_data() or b"")
+            except NotImplementedError:
+                # A filter PyPDF2 cannot decode (e.g. JBIG2): never reuse this page
+                digest.update(os.urandom(16))
+    return digest.hexdigest()
+
+
+def text_layer_digest(page, digest: str) -> str:
+    """
+    `digest` (the page_digest) extended with the fonts the page uses, which decide how
+    its content stream decodes to text.
+    """
+    text_digest = hashlib.sha256(digest.encode("utf-8"))
+    resources = page.get("/Resources")
+    fonts = resources.get_object().get("/Font") if resources else None
+    if fonts:
+        fonts = fonts.get_object()
+        for name in sorted(fonts):
+            font = fonts[name].get_object()
+            text_digest.update(name.encode("utf-8"))
+            text_digest.update(str(font.get("/BaseFont")).encode("utf-8"))
+            encoding = font.get("/Encoding")
+            if encoding is not None:
+                text_digest.update(repr(encoding.get_object()).encode("utf-8"))
+            to_unicode = font.get("/ToUnicode")
+            if to_unicode is not None:
+                text_digest.update(to_unicode.get_object().get_data())
+    return text_digest.hexdigest()
+
+
+def extract_page_range(path, start, end):
+    """
+    Text layer of pages [start, end) of the PDF at `path`, as (index, page digest,
+    text, reused) tuples.
+
+    A page's text is cached on disk by its content, so the unchanged pages of a revised
+    RFP are not extracted again (`reused`).
+    """
+    with open_content(path) as f:
+        reader = PdfReader(f)
+        pages = []
+        for index in range(start, end):
+            page = reader.pages[index]
+            digest = page_digest(page)
+            text_digest = text_layer_digest(page, digest)
+            text = document_cache.get_text(text_digest, PAGE_TEXT_VERSION)
+            reused = text is not None
+            if not reused:
+                text = page.extract_text()
+                # The document's own text is cached next, which evicts
+                document_cache.set_text(
+                    text_digest, PAGE_TEXT_VERSION, text, evict=False
+                )
+            pages.append((index, digest, text, reused))
+    return pages
+
+
+def needs_ocr(text) -> bool:
+    return len((text or "").strip()) < OCR_MIN_CHARS
+
+
+def ocr_page(path, index, dpi=OCR_DPI):
+    """
+    Rasterises one page of the PDF at `path` with pdftoppm and recognises it with
+    tesseract.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        image_prefix = os.path.join(temp_dir, "page")
+        subprocess.run(
+            [
+                "pdftoppm",
+                "-f",
+                str(index + 1),
+                "-l",
+                str(index + 1),
+                "-r",
+                str(dpi),
+                "-png",
+                "-singlefile",
+                path,
+                image_prefix,
+            ],
+            check=True,
+            capture_output=True,
+            timeout=OCR_TIMEOUT,
+        )
+        result = subprocess.run(
+            ["tesseract", f"{image_prefix}.png", "stdout"],
+            check=True,
+            capture_output=True,
+            timeout=OCR_TIMEOUT,
+        )
+    return result.stdout.decode("utf-8", errors="replace")
+
+
+async def recognise_page(path, index, digest, text):
+    """
+    The page's own text, or its OCR text when it is an image-only page.
+    """
+    if not OCR_ENABLED or not needs_ocr(text):
+        return text
+
+    cached = await run_io(document_cache.get_text, digest, OCR_VERSION)
+    if cached is not None:
+        return cached
+
+    try:
+        ocr_text = await run_parse(ocr_page, path, index)
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"Error running OCR on page {index + 1}: {e}")
+        return text
+
+    await run_io(document_cache.set_text, digest, OCR_VERSION, ocr_text)
+    return ocr_text
+
+
+async def iter_pdf_pages(document, count_reuse: bool = True):
+    """
+    Yields the text of each page of a staged PDF in order, as soon as it is available.
+    Pages taken from the page text cache are recorded as reused work unless
+    `count_reuse` is False.
+
+    Pages are extracted in batches of PAGES_PER_TASK across the parse process pool,
+    and image-only pages are OCR'd in parallel as their batch comes back, so a long
+    RFP extracts in time proportional to pages / cores. The tasks are given the
+    document's path (see StagedDocument.spool), not its bytes.
+    """
+    path = await run_io(document.spool)
+    total = await run_parse(count_pages, path)
+
+    async def process(start):
+        pages = await run_parse(
+            extract_page_range, path, start, min(start + PAGES_PER_TASK, total)
+        )
+        if count_reuse:
+            reused = sum(page[3] for page in pages)
+            record_reuse("pages", reused=reused, computed=len(pages) - reused)
+        return await asyncio.gather(
+            *[
+                recognise_page(path, index, digest, text)
+                for index, digest, text, _ in pages
+            ]
+        )
+
+    batches = [
+        asyncio.ensure_future(process(start))
+        for start in range(0, total, PAGES_PER_TASK)
+    ]
+    try:
+        for batch in batches:
+            for text in await batch:
+                yield text
+    finally:
+        # The consumer may stop early; don't leave batches running for nothing
+        for batch in batches:
+            batch.cancel()
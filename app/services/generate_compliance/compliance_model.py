@@ -1,8 +1,8 @@
 import yaml
-import torch
 import os
-import boto3
-from botocore.exceptions import NoCredentialsError
+
+from app.services.backends import OnnxSequenceClassifier, check_backend, load_int8
+from core.utils.artifacts import fetch_artifact
 
 config_path = os.path.join(os.path.dirname(__file__), "config.yaml")
 
@@ -28,23 +28,72 @@ class ComplianceModel:
         self.model_name = model_name
         self.model = None
         self.tokenizer = None
-        self.input = ""
-        self.output = ""
         self.config = config
 
-    def predict_compliance(self):
-        # Tokenize the input text
+    def artifact_path(self):
+        """
+        Local directory of the artefact served by the configured runtime backend.
+        """
+        backend = self.config["runtime"]["backend"]
+        check_backend(backend, {"pytorch", "int8", "onnx"})
+        if backend == "pytorch":
+            return self.model_name
+        return self.config["runtime"][f"{backend}_path"]
+
+    def fetch(self, verify=None):
+        """
+        Downloads the served artefact from S3 unless a complete copy is already local.
+        """
+        model_path = self.artifact_path()
+        return fetch_artifact(
+            os.path.basename(model_path.rstrip("/")), model_path, verify=verify
+        )
+
+    def load(self, model_path=None):
+        """
+        Loads the fine-tuned BERT classifier and its tokenizer from `model_path`, as
+        returned by fetch(), fetching them first if it is not given.
+        """
+        # transformers and torch load with the model, not with the module
+        from transformers import BertForSequenceClassification, BertTokenizer
+
+        backend = self.config["runtime"]["backend"]
+        model_path = model_path or self.fetch()
+
+        if backend == "int8":
+            self.model = load_int8(BertForSequenceClassification, model_path)
+        elif backend == "onnx":
+            self.model = OnnxSequenceClassifier(model_path)
+        else:
+            self.model = BertForSequenceClassification.from_pretrained(
+                model_path, num_labels=len(label_map), use_safetensors=True
+            )
+        self.tokenizer = BertTokenizer.from_pretrained(model_path, use_safetensors=True)
+
+        # The model is only ever used for inference
+        self.model.eval()
+
+    def warmup(self):
+        """
+        Runs one forward pass so the first real request does not pay for lazy initialisation.
+        """
+        self.predict_compliance("Warm-up request for proposal.")
+
+    def predict_compliance(self, text):
+        return self.predict_batch([text])[0]
+
+    def predict_batch(self, texts):
+        import torch
+
+        # Tokenize the input texts, padding only to the longest one in the batch
         inputs = self.tokenizer(
-            self.input,
-            padding="max_length",
+            texts,
+            padding="longest",
             truncation=True,
             max_length=512,
             return_tensors="pt",
         )
 
-        # Ensure the model is in evaluation mode
-        self.model.eval()
-
         # Make predictions (forward pass)
         with torch.no_grad():
             outputs = self.model(**inputs)
@@ -57,45 +106,85 @@ class ComplianceModel:
         probabilities = softmax(logits)
 
         # Get the predicted label index (class)
-        predicted_label = torch.argmax(probabilities, dim=-1)
-
-        # Convert the predicted index to the corresponding label name
-        self.output = label_map[predicted_label.item()]
-
-
-    def download_from_s3(self, bucket_name, model_key):
-        # Create an S3 client
-        s3_client = boto3.client("s3")
-
-        # Download the model files recursively from S3
-        def download_directory_from_s3(s3_bucket, s3_prefix, local_path):
-            if not os.path.exists(local_path):
-                os.makedirs(local_path)
-
-            # List objects under the specified S3 prefix (model_key)
-            try:
-                response = s3_client.list_objects_v2(Bucket=s3_bucket, Prefix=s3_prefix)
-                if "Contents" in response:
-                    for obj in response["Contents"]:
-                        s3_file_key = obj["Key"]
-                        local_file_path = os.path.join(
-                            local_path, os.path.relpath(s3_file_key, s3_prefix)
-                        )
-
-                        # Create directories if they do not exist
-                        os.makedirs(os.path.dirname(local_file_path), exist_ok=True)
-
-                        # Download the file from S3
-                        print(f"Downloading {s3_file_key} to {local_file_path}")
-                        s3_client.download_file(s3_bucket, s3_file_key, local_file_path)
-                else:
-                    print(f"No files found for {s3_prefix} in bucket {s3_bucket}")
-            except NoCredentialsError:
-                print("Credentials not available")
-            except Exception as e:
-                print(f"Error downloading from S3: {str(e)}")
-
-        # Download the model and tokenizer from the S3 bucket to the local model_key directory
-        download_directory_from_s3(
-            bucket_name, model_key, config["model"]["model_path"]
+        predicted_labels = torch.argmax(probabilities, dim=-1)
+
+        # Convert the predicted indices to the corresponding label names
+        return [label_map[label] for label in predicted_labels.tolist()]
+
+    def encode_windows(
+        self, text, window_tokens=512, stride_tokens=128, max_windows=None
+    ):
+        """
+        Splits `text` into overlapping windows of at most `window_tokens` tokens
+        (special tokens included), consecutive windows sharing `stride_tokens` tokens.
+
+        Returns a list of (start, end, input_ids) with start/end as token offsets into
+        the document. With max_windows=1 this is plain truncation to the first window.
+        """
+        token_ids = self.tokenizer(
+            text, add_special_tokens=False, truncation=False, verbose=False
+        )["input_ids"]
+
+        body = window_tokens - self.tokenizer.num_special_tokens_to_add()
+        step = max(body - stride_tokens, 1)
+
+        windows = []
+        start = 0
+        while True:
+            end = min(start + body, len(token_ids))
+            windows.append(
+                (
+                    start,
+                    end,
+                    self.tokenizer.build_inputs_with_special_tokens(
+                        token_ids[start:end]
+                    ),
+                )
+            )
+            if end >= len(token_ids) or (max_windows and len(windows) >= max_windows):
+                break
+            start += step
+
+        return windows
+
+    def predict_windows(self, windows):
+        """
+        One forward pass over a batch of encoded windows, padded to the longest.
+
+        Returns the logits of each window as a list of floats.
+        """
+        import torch
+
+        inputs = self.tokenizer.pad(
+            {"input_ids": windows}, padding="longest", return_tensors="pt"
         )
+
+        with torch.no_grad():
+            outputs = self.model(**inputs)
+
+        return outputs.logits.tolist()
+
+    @staticmethod
+    def combine_windows(window_logits, aggregation="mean"):
+        """
+        Combines per-window logits into one label from label_map.
+
+        Returns the label index and, per window, its predicted index and probabilities.
+        """
+        import torch
+
+        logits = torch.tensor(window_logits)
+        if aggregation == "max":
+            combined = logits.max(dim=0).values
+        elif aggregation == "mean":
+            combined = logits.mean(dim=0)
+        else:
+            raise ValueError(f"Unknown window aggregation: {aggregation}")
+
+        probabilities = torch.softmax(logits, dim=-1)
+        window_scores = [
+            {"label_index": int(p.argmax()), "probabilities": p.tolist()}
+            for p in probabilities
+        ]
+
+        return int(combined.argmax()), window_scores
@@ -1,28 +1,89 @@
-import os
-from transformers import BertForSequenceClassification, BertTokenizer
+import asyncio
 
-from app.services.generate_compliance.compliance_model import ComplianceModel
+from app.services.generate_compliance.compliance_model import config, label_map
+from app.services.model_registry import registry
+from core.utils.batching import MicroBatcher
+from core.utils.executors import run_inference
+from core.utils.metrics import count_tokens, observe_batch
+from core.utils.reuse import content_key, intermediate_cache, record_reuse
 
+# Identifies the model, runtime backend and post-processing behind a cached compliance
+# report; the backends' outputs differ numerically
+RESULT_VERSION = (
+    f"{config['model']['model_name']}-{config['runtime']['backend']}-"
+    f"{config['cache']['version']}"
+)
 
-async def generate_compliance(section_text):
+
+async def predict_windows(windows):
+    compliance_model = registry.get("compliance")
+    observe_batch("compliance", len(windows))
+    count_tokens("compliance", input_tokens=sum(len(window) for window in windows))
+
+    def predict():
+        with registry.track("compliance"):
+            return compliance_model.predict_windows(windows)
+
+    return await run_inference(predict)
+
+
+# Windows from concurrent requests share forward passes
+batcher = MicroBatcher(
+    predict_windows,
+    max_batch_size=config["batching"]["max_batch_size"],
+    max_wait_ms=config["batching"]["max_wait_ms"],
+)
+
+
+async def score_compliance(section_text):
     """
-    This function generates a compliance report based on the provided technical requirements.
+    Classifies the text in overlapping token windows and combines them into one label.
+
+    Returns the report from label_map plus the predicted label and probabilities of
+    every window, with its token offsets in the text.
     """
+    compliance_model = registry.get("compliance")
+    chunking = config["chunking"]
+
+    windows = await run_inference(
+        compliance_model.encode_windows,
+        section_text,
+        window_tokens=chunking["window_tokens"],
+        stride_tokens=chunking["stride_tokens"],
+        max_windows=chunking["max_windows"] if chunking["enabled"] else 1,
+    )
 
-    compliance_model = ComplianceModel()
-    compliance_model.input = section_text
+    # Windows already scored (in this document or a previous revision of it) are not
+    # run through the model again
+    keys = [
+        content_key("compliance_window", RESULT_VERSION, input_ids)
+        for _, _, input_ids in windows
+    ]
+    cached = await intermediate_cache.get_many(keys)
+    computed = {}
 
-    if not os.path.isdir(compliance_model.config["model"]["model_path"]):
-        compliance_model.download_from_s3("rfp-models", "compliance_model_fine_tuned")
+    async def logits_of(key, input_ids):
+        if key in cached:
+            return cached[key]
+        computed[key] = await batcher.submit(input_ids)
+        return computed[key]
 
-    compliance_model.model = BertForSequenceClassification.from_pretrained(
-        compliance_model.model_name, num_labels=9, use_safetensors=True
-    )
-    compliance_model.tokenizer = BertTokenizer.from_pretrained(
-        compliance_model.model_name, use_safetensors=True
+    window_logits = await asyncio.gather(
+        *[logits_of(key, input_ids) for key, (_, _, input_ids) in zip(keys, windows)]
     )
+    reused = sum(key in cached for key in keys)
+    record_reuse("compliance_windows", reused=reused, computed=len(keys) - reused)
+    await intermediate_cache.set_many(computed)
 
-    compliance_model.predict_compliance()
-    compliance_report = compliance_model.output
+    label_index, window_scores = compliance_model.combine_windows(
+        window_logits, aggregation=chunking["aggregation"]
+    )
+    for (start, end, _), window_score in zip(windows, window_scores):
+        window_score["start_token"] = start
+        window_score["end_token"] = end
 
-    return compliance_report
+    return {
+        "report": label_map[label_index],
+        "label_index": label_index,
+        "windows": window_scores,
+    }
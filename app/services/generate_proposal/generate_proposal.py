@@ -1,86 +1,286 @@
-from app.services.generate_proposal.summarization_model import SummarizationModel
-from transformers import BartForConditionalGeneration, BartTokenizer
-from peft import get_peft_model, LoraConfig
-import os
-
-import openai
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage
+from app.services.generate_proposal.summarization_model import config
+from app.services.model_registry import registry
+from app.services.preprocess import (
+    DocumentSession,
+    clean_sections,
+    clean_text,
+    extract_text,
+)
+from core.utils.executors import run_inference, run_io, run_parse
+from core.utils.llm_cache import llm_cache
+from core.utils.metrics import count_tokens, time_stage
+from core.utils.pipeline import Stage, run_stages
+from core.utils.reuse import content_key, intermediate_cache, record_reuse
 
 from dotenv import load_dotenv
 import os
+import time
 
 load_dotenv()
 
 api_key = os.environ.get("OPENAI_API_KEY")
 
+CHAT_MODEL = "gpt-4"
+
+# Control creativity (lower = more deterministic)
+CHAT_TEMPERATURE = 0
+
+# Bump when build_technical_messages changes, so memoised answers are not reused
+TECHNICAL_PROMPT_VERSION = "1"
+
+# "openai" in production, "fake" for a local stand-in
+CHAT_MODEL_BACKEND = os.environ.get("CHAT_MODEL_BACKEND", "openai")
+
+FAKE_TECHNICAL_APPROACH = (
+    "Phase 1: Discovery\nConfirm requirements, stakeholders and acceptance criteria.\n"
+    "Phase 2: Design\nProduce the solution architecture and delivery plan.\n"
+    "Phase 3: Delivery\nBuild, test and deploy in iterations with progress reports.\n"
+    "Phase 4: Support\nTrain users, hand over documentation and provide maintenance."
+)
+
+TECHNICAL_CONTENT_ERROR = "An error occurred while generating the technical content."
+
+# Identifies the models, the summariser's runtime backend and the prompts behind a
+# cached proposal; the backends' outputs differ numerically
+RESULT_VERSION = (
+    f"{config['model']['model_name']}-{config['runtime']['backend']}-"
+    f"{CHAT_MODEL if CHAT_MODEL_BACKEND == 'openai' else CHAT_MODEL_BACKEND}-"
+    f"{config['cache']['version']}"
+)
+
 
-def apply_lora_to_bart(model_name: str, lora_config: dict):
-    model = BartForConditionalGeneration.from_pretrained(model_name)
-    # Apply LoRA to the model
-    model = get_peft_model(model, LoraConfig(**lora_config))
-    return model
+# Identifies the summariser and its runtime backend behind cached chunk summaries
+SUMMARY_VERSION = (
+    f"{config['model']['model_name']}-{config['runtime']['backend']}-"
+    f"{config['cache']['version']}"
+)
 
 
-def generate_technical_content(requirements):
+def get_chat_model():
     """
-    Generate a technical approach based on given requirements and expertise.
+    The chat model behind the technical approach.
 
-    Parameters:
-        requirements (str): A description of the requirements.
-        expertise (str): A description of the expertise or domain knowledge.
+    Set CHAT_MODEL_BACKEND=fake to use a local fake that streams a canned answer, for
+    development and tests without OpenAI.
+    """
+    # langchain and the OpenAI client are imported on first use, not at server start
+    if CHAT_MODEL_BACKEND == "fake":
+        from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+        return FakeListChatModel(responses=[FAKE_TECHNICAL_APPROACH], sleep=0.01)
+
+    from langchain_openai import ChatOpenAI
+
+    # Initialize ChatOpenAI with the API key and model configuration
+    return ChatOpenAI(
+        api_key=api_key,  # Replace with your actual API key or use environment variables for security
+        model=CHAT_MODEL,
+        temperature=CHAT_TEMPERATURE,
+    )
 
-    Returns:
-        str: The generated technical approach content.
+
+def chat_model_name():
+    return CHAT_MODEL if CHAT_MODEL_BACKEND == "openai" else CHAT_MODEL_BACKEND
+
+
+def count_chat_tokens(message):
     """
-    try:
-        # Initialize ChatOpenAI with the API key and model configuration
-        chat_gpt = ChatOpenAI(
-            api_key=api_key,  # Replace with your actual API key or use environment variables for security
-            model="gpt-4",
-            temperature=0,  # Control creativity (lower = more deterministic)
+    Adds the token usage the chat model reported on `message` (if any) to the metrics.
+    """
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        count_tokens(
+            chat_model_name(),
+            input_tokens=usage.get("input_tokens", 0),
+            output_tokens=usage.get("output_tokens", 0),
         )
 
-        # Prepare the message for the AI model
-        messages = [
-            HumanMessage(
-                content=(
-                    f"Generate a technical approach based on the following requirements:\n"
-                    f"Requirements: {requirements}\n"
-                    f"Output a detailed and structured technical approach to achieve RFP contract phase by phase."
-                )
-            ),
-        ]
 
-        # Call the AI model to get a response
-        ai_message = chat_gpt.invoke(messages)
+def technical_cache_key(requirements):
+    model = chat_model_name()
+    return llm_cache.make_key(
+        "technical", model, CHAT_TEMPERATURE, TECHNICAL_PROMPT_VERSION, requirements
+    )
+
+
+def build_technical_messages(requirements):
+    from langchain_core.messages import HumanMessage
 
-        return ai_message.content
+    # Prepare the message for the AI model
+    return [
+        HumanMessage(
+            content=(
+                f"Generate a technical approach based on the following requirements:\n"
+                f"Requirements: {requirements}\n"
+                f"Output a detailed and structured technical approach to achieve RFP contract phase by phase."
+            )
+        ),
+    ]
+
+
+async def stream_technical_content(requirements):
+    """
+    Same as generate_technical_approach, yielding the answer as the model produces it.
+
+    A memoised answer is yielded in one piece. Unlike generate_technical_approach, a
+    failed call raises rather than producing the fallback text, since part of the
+    answer may already have been sent.
+    """
+    key = technical_cache_key(requirements)
+    cached = await llm_cache.get("technical", key)
+    if cached is not None:
+        yield cached
+        return
+    llm_cache.count_miss("technical")
+
+    chunks = []
+    try:
+        started = time.perf_counter()
+        chat_gpt = get_chat_model()
+
+        with time_stage("chat"):
+            async for chunk in chat_gpt.astream(build_technical_messages(requirements)):
+                # Usage, when reported, comes on the last chunk
+                count_chat_tokens(chunk)
+                if chunk.content:
+                    chunks.append(chunk.content)
+                    yield chunk.content
 
     except Exception as e:
-        # Handle any errors that occur during the process
         print(f"Error generating technical content: {e}")
-        return "An error occurred while generating the technical content."
+        raise
+
+    await llm_cache.set(key, "".join(chunks), time.perf_counter() - started)
+
+
+def chunk_summary_key(settings, chunk):
+    return content_key(
+        "chunk_summary",
+        SUMMARY_VERSION,
+        settings["chunk_summary_tokens"],
+        settings["num_beams"],
+        chunk,
+    )
 
 
-async def generate_proposal(content, technical_requirements):
-    summarization_model = SummarizationModel()
-    summarization_model.input = "Summarize the following RFP document.\n\n" + content
+async def generate_executive_summary(content, sections=None):
+    """
+    BART summary of the cleaned document text.
+
+    In map_reduce mode the first-level chunk summaries are cached by chunk text, so a
+    revised RFP only summarises the chunks that changed. With `sections` (the cleaned
+    text of each section) and summarization.section_chunks on, chunks follow the
+    sections, which keeps the unchanged ones identical across revisions.
+    """
+    summarization_model = registry.get("summarization")
+    settings = summarization_model.config["summarization"]
+
+    if settings["mode"] != "map_reduce":
+
+        def summarise():
+            with registry.track("summarization"):
+                return summarization_model.generate_summary(content)
+
+        return await run_inference(summarise)
+
+    if sections is not None and settings["section_chunks"]:
+        chunks = await run_inference(summarization_model.chunk_sections, sections)
+    else:
+        chunks = await run_inference(summarization_model.chunk_text, content)
+
+    keys = {chunk: chunk_summary_key(settings, chunk) for chunk in chunks}
+    cached = await intermediate_cache.get_many(list(keys.values()))
+    known = {chunk: cached[key] for chunk, key in keys.items() if key in cached}
+
+    def map_reduce():
+        with registry.track("summarization"):
+            return summarization_model.map_reduce_summary(content, chunks, known)
 
-    if not os.path.isdir(summarization_model.config["model"]["model_path"]):
-        summarization_model.download_from_s3(
-            "rfp-models", "summarization_model_fine_tuned"
+    summary, stats = await run_inference(map_reduce)
+    if len(chunks) > 1:
+        new = {chunk: stats["summaries"][chunk] for chunk in keys if chunk not in known}
+        record_reuse("chunk_summaries", reused=len(known), computed=len(new))
+        await intermediate_cache.set_many(
+            {keys[chunk]: chunk_summary for chunk, chunk_summary in new.items()}
         )
+    return summary
 
-    summarization_model.model = apply_lora_to_bart(
-        summarization_model.model_name, summarization_model.config["lora"]
-    )
-    summarization_model.tokenizer = BartTokenizer.from_pretrained(
-        "models/summarization_model_fine_tuned"
-    )
-    summarization_model.generate_summary()
-    summary = summarization_model.output
 
-    technical_approach = generate_technical_content(technical_requirements)
+async def generate_technical_approach(technical_requirements):
+    """
+    Technical approach for the given requirements from the chat model, memoised on the
+    normalised requirements.
+
+    Failed calls are not memoised.
+    """
+
+    def invoke():
+        chat_gpt = get_chat_model()
+        with time_stage("chat"):
+            message = chat_gpt.invoke(build_technical_messages(technical_requirements))
+        count_chat_tokens(message)
+        return message.content
+
+    try:
+        return await llm_cache.get_or_call(
+            "technical",
+            technical_cache_key(technical_requirements),
+            lambda: run_io(invoke),
+        )
+    except Exception as e:
+        print(f"Error generating technical content: {e}")
+        return TECHNICAL_CONTENT_ERROR
+
+
+async def run_proposal_pipeline(documents, file_extension):
+    """
+    Runs the proposal pipeline for one staged RFP as a dependency graph.
+
+    Local extraction feeds the BART summary, the tech query feeds GPT-4, and the budget
+    query stands alone, so end-to-end latency is the critical path rather than the sum
+    of all stages. Returns the proposal and the per-stage timings.
+    """
+    # One parse and one embedding pass serve every query on this document
+    session = DocumentSession(documents=documents, file_extension=file_extension)
+
+    async def extract():
+        return await extract_text(documents[0], file_extension)
+
+    async def clean(extract):
+        with time_stage("clean"):
+            return await run_parse(clean_text, extract)
+
+    async def sections(extract):
+        with time_stage("sections"):
+            return await run_parse(clean_sections, extract)
+
+    async def summary(clean, sections):
+        return await generate_executive_summary(clean, sections)
+
+    async def tech_query():
+        return await session.query("tech")
+
+    async def budget_query():
+        return await session.query("budget")
+
+    async def technical_approach(tech_query):
+        return await generate_technical_approach(tech_query)
+
+    results, timings = await run_stages(
+        [
+            Stage("extract", extract),
+            Stage("clean", clean, deps=["extract"]),
+            Stage("sections", sections, deps=["extract"]),
+            Stage("summary", summary, deps=["clean", "sections"]),
+            Stage("tech_query", tech_query),
+            Stage("budget_query", budget_query),
+            Stage("technical_approach", technical_approach, deps=["tech_query"]),
+        ]
+    )
 
-    return {"executive_summary": summary, "technical_approach": technical_approach}
+    proposal = {
+        "executive_summary": results["summary"],
+        "technical_approach": results["technical_approach"],
+        "budget_info": results["budget_query"],
+    }
+    return proposal, timings
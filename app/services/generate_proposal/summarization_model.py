@@ -1,8 +1,10 @@
+import hashlib
 import yaml
 import os
-import boto3
-from botocore.exceptions import NoCredentialsError
 
+from app.services.backends import check_backend, load_int8
+from core.utils.artifacts import fetch_artifact
+from core.utils.metrics import count_tokens, observe_batch, time_stage
 
 config_path = os.path.join(os.path.dirname(__file__), "config.yaml")
 
@@ -10,6 +12,29 @@ config_path = os.path.join(os.path.dirname(__file__), "config.yaml")
 with open(config_path, "r") as f:
     config = yaml.safe_load(f)
 
+SUMMARY_PROMPT = "Summarize the following RFP document.\n\n"
+
+
+def load_fine_tuned_bart(model_path: str):
+    """
+    Loads the fine-tuned summariser with its LoRA adapter merged into the base weights.
+
+    `model_path` holds either a saved LoRA adapter (adapter_config.json) on top of the
+    base model it names, or full fine-tuned weights.
+    """
+    from peft import PeftConfig, PeftModel
+    from transformers import BartForConditionalGeneration
+
+    if not os.path.isfile(os.path.join(model_path, "adapter_config.json")):
+        return BartForConditionalGeneration.from_pretrained(model_path)
+
+    base_model = BartForConditionalGeneration.from_pretrained(
+        PeftConfig.from_pretrained(model_path).base_model_name_or_path
+    )
+    model = PeftModel.from_pretrained(base_model, model_path)
+    # Folding the adapter into the weights removes its overhead from every forward pass
+    return model.merge_and_unload()
+
 
 class SummarizationModel:
     def __init__(self, model_name=config["model"]["model_path"], config=config):
@@ -17,59 +42,212 @@ class SummarizationModel:
         self.model_name = model_name
         self.model = None
         self.tokenizer = None
-        self.input = ""
-        self.output = ""
 
-    def generate_summary(self, max_length=1024):
+    def artifact_path(self):
+        """
+        Local directory of the artefact served by the configured runtime backend.
+        """
+        backend = self.config["runtime"]["backend"]
+        check_backend(backend, {"pytorch", "merged", "int8"})
+        if backend == "pytorch":
+            return self.model_name
+        return self.config["runtime"][f"{backend}_path"]
+
+    def fetch(self, verify=None):
+        """
+        Downloads the served artefact from S3 unless a complete copy is already local.
+        """
+        model_path = self.artifact_path()
+        return fetch_artifact(
+            os.path.basename(model_path.rstrip("/")), model_path, verify=verify
+        )
+
+    def load(self, model_path=None):
+        """
+        Loads the fine-tuned BART summariser and its tokenizer from `model_path`, as
+        returned by fetch(), fetching them first if it is not given.
+        """
+        # Deferred so that importing this module (for its config) stays cheap
+        from transformers import BartForConditionalGeneration, BartTokenizer
+
+        backend = self.config["runtime"]["backend"]
+        model_path = model_path or self.fetch()
+
+        if backend == "int8":
+            self.model = load_int8(BartForConditionalGeneration, model_path)
+        elif backend == "merged":
+            self.model = BartForConditionalGeneration.from_pretrained(model_path)
+        else:
+            self.model = load_fine_tuned_bart(model_path)
+        self.tokenizer = BartTokenizer.from_pretrained(model_path)
+
+        # The model is only ever used for inference
+        self.model.eval()
+
+    def warmup(self):
+        """
+        Runs one short generation so the first real request does not pay for lazy initialisation.
+        """
+        self.summarize_batch([SUMMARY_PROMPT + "Warm-up."])
+
+    def generate_summary(self, content):
+        """
+        Summarises an RFP, in one pass or map-reduce depending on summarization.mode.
+        """
+        if self.config["summarization"]["mode"] == "map_reduce":
+            summary, _ = self.map_reduce_summary(content)
+            return summary
+        return self.summarize_batch([SUMMARY_PROMPT + content])[0]
+
+    def summarize_batch(self, texts, max_length=None):
+        """
+        Summarises several inputs in one `generate` call, padded to the longest input.
+        """
+        settings = self.config["summarization"]
         inputs = self.tokenizer(
-            self.input,
+            texts,
             return_tensors="pt",
             truncation=True,
-            padding="max_length",
-            max_length=max_length,
+            padding="longest",
+            max_length=settings["max_input_tokens"],
         )
 
         # Generate summary (use `generate` method)
-        summary_ids = self.model.generate(
-            inputs["input_ids"], max_length=150, num_beams=4, early_stopping=True
+        observe_batch("summarization", len(texts))
+        with time_stage("bart_generate"):
+            summary_ids = self.model.generate(
+                inputs["input_ids"],
+                attention_mask=inputs["attention_mask"],
+                max_length=max_length or settings["summary_tokens"],
+                num_beams=settings["num_beams"],
+                early_stopping=True,
+            )
+        count_tokens(
+            "summarization",
+            input_tokens=int(inputs["attention_mask"].sum()),
+            output_tokens=int((summary_ids != self.tokenizer.pad_token_id).sum()),
         )
 
         # Decode the generated summary ids to text
-        self.output = self.tokenizer.decode(summary_ids[0], skip_special_tokens=True)
-
-    def download_from_s3(self, bucket_name, model_key):
-        # Create an S3 client
-        s3_client = boto3.client("s3")
-
-        # Download the model files recursively from S3
-        def download_directory_from_s3(s3_bucket, s3_prefix, local_path):
-            if not os.path.exists(local_path):
-                os.makedirs(local_path)
-
-            # List objects under the specified S3 prefix (model_key)
-            try:
-                response = s3_client.list_objects_v2(Bucket=s3_bucket, Prefix=s3_prefix)
-                if "Contents" in response:
-                    for obj in response["Contents"]:
-                        s3_file_key = obj["Key"]
-                        local_file_path = os.path.join(
-                            local_path, os.path.relpath(s3_file_key, s3_prefix)
-                        )
-
-                        # Create directories if they do not exist
-                        os.makedirs(os.path.dirname(local_file_path), exist_ok=True)
-
-                        # Download the file from S3
-                        print(f"Downloading {s3_file_key} to {local_file_path}")
-                        s3_client.download_file(s3_bucket, s3_file_key, local_file_path)
-                else:
-                    print(f"No files found for {s3_prefix} in bucket {s3_bucket}")
-            except NoCredentialsError:
-                print("Credentials not available")
-            except Exception as e:
-                print(f"Error downloading from S3: {str(e)}")
-
-        # Download the model and tokenizer from the S3 bucket to the local model_key directory
-        download_directory_from_s3(
-            bucket_name, model_key, config["model"]["model_path"]
+        return self.tokenizer.batch_decode(summary_ids, skip_special_tokens=True)
+
+    def chunk_budget(self):
+        """
+        Tokens of document text that fit the encoder alongside the prompt.
+        """
+        return (
+            self.config["summarization"]["max_input_tokens"]
+            - self.tokenizer.num_special_tokens_to_add()
+            - len(self.tokenizer(SUMMARY_PROMPT, add_special_tokens=False)["input_ids"])
         )
+
+    def chunk_text(self, text):
+        """
+        Splits text into overlapping chunks that fit the encoder alongside the prompt.
+        """
+        settings = self.config["summarization"]
+        budget = self.chunk_budget()
+        step = max(budget - settings["chunk_overlap_tokens"], 1)
+
+        token_ids = self.tokenizer(
+            text, add_special_tokens=False, truncation=False, verbose=False
+        )["input_ids"]
+
+        chunks = []
+        for start in range(0, max(len(token_ids), 1), step):
+            chunks.append(self.tokenizer.decode(token_ids[start : start + budget]))
+            if start + budget >= len(token_ids):
+                break
+        return chunks
+
+    def chunk_sections(self, sections):
+        """
+        Packs consecutive section texts into chunks that fit the encoder, never
+        splitting a section that fits on its own.
+
+        A chunk closes when the next section would overflow it or after a boundary
+        section (see section_boundary_every), so chunk boundaries depend on the sections
+        around them rather than on everything before them. Longer sections are split
+        with chunk_text.
+        """
+        budget = self.chunk_budget()
+        every = self.config["summarization"]["section_boundary_every"]
+
+        chunks = []
+        current = []
+        used = 0
+        for section in sections:
+            tokens = len(
+                self.tokenizer(section, add_special_tokens=False, verbose=False)[
+                    "input_ids"
+                ]
+            )
+            # One token of slack per join, where the tokenizer may merge differently
+            if current and used + tokens + len(current) > budget:
+                chunks.append(" ".join(current))
+                current, used = [], 0
+            if tokens > budget:
+                chunks.extend(self.chunk_text(section))
+                continue
+            current.append(section)
+            used += tokens
+            digest = hashlib.sha256(section.encode("utf-8")).digest()
+            if int.from_bytes(digest[:4], "big") % every == 0:
+                chunks.append(" ".join(current))
+                current, used = [], 0
+        if current:
+            chunks.append(" ".join(current))
+        return chunks or [""]
+
+    def map_reduce_summary(self, content, chunks=None, known=None):
+        """
+        Summarises a document of any length: summarise each chunk (map), join the chunk
+        summaries and repeat until they fit in one encoder pass, then summarise that (reduce).
+
+        `chunks` replaces the first-level chunks of `content` (see chunk_sections), and
+        chunks found in `known` (chunk text -> summary) are not summarised again.
+
+        Returns the summary and stats on the work done: chunks per level, generate
+        calls, and the chunk summaries reused and the new ones, by chunk text.
+        """
+        settings = self.config["summarization"]
+        known = known or {}
+        stats = {"levels": [], "generate_calls": 0, "reused": 0, "summaries": {}}
+
+        if chunks is None:
+            chunks = self.chunk_text(content)
+        while len(chunks) > 1:
+            stats["levels"].append(len(chunks))
+
+            missing = list(
+                dict.fromkeys(chunk for chunk in chunks if chunk not in known)
+            )
+            stats["reused"] += len(chunks) - len(missing)
+            for start in range(0, len(missing), settings["batch_size"]):
+                batch = missing[start : start + settings["batch_size"]]
+                stats["summaries"].update(
+                    zip(
+                        batch,
+                        self.summarize_batch(
+                            [SUMMARY_PROMPT + chunk for chunk in batch],
+                            max_length=settings["chunk_summary_tokens"],
+                        ),
+                    )
+                )
+                stats["generate_calls"] += 1
+            summaries = [
+                known[chunk] if chunk in known else stats["summaries"][chunk]
+                for chunk in chunks
+            ]
+
+            next_chunks = self.chunk_text(" ".join(summaries))
+            if len(next_chunks) >= len(chunks):
+                # The summaries are not getting shorter; stop instead of looping
+                next_chunks = next_chunks[:1]
+            chunks = next_chunks
+
+        stats["levels"].append(1)
+        stats["generate_calls"] += 1
+        summary = self.summarize_batch([SUMMARY_PROMPT + chunks[0]])[0]
+
+        return summary, stats
@@ -0,0 +1,185 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from app.services.generate_compliance.compliance_model import ComplianceModel
+from app.services.generate_proposal.summarization_model import SummarizationModel
+from core.utils.metrics import time_stage
+from core.utils.misc import get_process_rss_bytes
+
+
+class ModelNotReadyError(RuntimeError):
+    pass
+
+
+class ModelRegistry:
+    """
+    Process-wide holder for the fine-tuned models.
+
+    Models are loaded, put in eval mode and warmed up once (normally from the FastAPI
+    startup hook) and then shared by every request for the life of the process.
+    """
+
+    def __init__(self, factories=None):
+        self.factories = factories or {
+            "compliance": ComplianceModel,
+            "summarization": SummarizationModel,
+        }
+        self.models = {}
+        self.stats = {
+            name: {
+                "status": "pending",
+                "error": None,
+                "fetch_seconds": None,
+                "load_seconds": None,
+                "warmup_seconds": None,
+                "parameter_bytes": None,
+                "rss_delta_bytes": None,
+                "inference_count": 0,
+                "inference_seconds_total": 0.0,
+                "inference_seconds_last": None,
+            }
+            for name in self.factories
+        }
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return all(stat["status"] == "ready" for stat in self.stats.values())
+
+    def load(self):
+        """
+        Loads and warms up every registered model that is not loaded yet.
+
+        The models' artefacts are downloaded first, all at once, so a fresh pod waits
+        for the slowest download rather than the sum of them.
+        """
+        with self._lock:
+            pending = {
+                name: factory()
+                for name, factory in self.factories.items()
+                if name not in self.models
+            }
+            with ThreadPoolExecutor(max_workers=max(len(pending), 1)) as pool:
+                fetched = list(pool.map(self._fetch_one, pending.items()))
+            for (name, model), (ok, model_path) in zip(pending.items(), fetched):
+                if ok:
+                    self._load_one(name, model, model_path)
+
+    def _fetch_one(self, item):
+        """
+        (whether the model can be loaded, the local path it was fetched to if any)
+        """
+        name, model = item
+        stat = self.stats[name]
+        if not hasattr(model, "fetch"):
+            return True, None
+        stat["status"] = "downloading"
+        try:
+            start = time.perf_counter()
+            model_path = model.fetch()
+            stat["fetch_seconds"] = time.perf_counter() - start
+        except Exception as e:
+            print(f"Error downloading {name} model: {e}")
+            stat["status"] = "failed"
+            stat["error"] = str(e)
+            return False, None
+        return True, model_path
+
+    def _load_one(self, name, model, model_path=None):
+        stat = self.stats[name]
+        stat["status"] = "loading"
+        rss_before = get_process_rss_bytes()
+
+        try:
+            start = time.perf_counter()
+            if model_path:
+                # Already fetched: don't check the artefact against S3 a second time
+                model.load(model_path)
+            else:
+                model.load()
+            stat["load_seconds"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            model.warmup()
+            stat["warmup_seconds"] = time.perf_counter() - start
+        except Exception as e:
+            print(f"Error loading {name} model: {e}")
+            stat["status"] = "failed"
+            stat["error"] = str(e)
+            return
+
+        stat["parameter_bytes"] = sum(
+            t.numel() * t.element_size()
+            for t in list(model.model.parameters()) + list(model.model.buffers())
+        )
+        stat["rss_delta_bytes"] = get_process_rss_bytes() - rss_before
+        stat["status"] = "ready"
+        stat["error"] = None
+        self.models[name] = model
+
+    def warmup(self):
+        """
+        Warms up the loaded models again, e.g. in a worker forked from the process that
+        loaded them, whose torch thread pools start cold.
+        """
+        for name, model in self.models.items():
+            try:
+                start = time.perf_counter()
+                model.warmup()
+                self.stats[name]["warmup_seconds"] = time.perf_counter() - start
+            except Exception as e:
+                print(f"Error warming up {name} model: {e}")
+
+    def share_memory(self):
+        """
+        Moves the loaded models' weights into shared memory, for forked workers.
+        """
+        for model in self.models.values():
+            if hasattr(model.model, "share_memory"):
+                model.model.share_memory()
+
+    def get(self, name):
+        model = self.models.get(name)
+        if model is None:
+            raise ModelNotReadyError(
+                f"The {name} model is not ready ({self.stats[name]['status']})."
+            )
+        return model
+
+    @contextmanager
+    def track(self, name):
+        """
+        Records the latency of one inference call against the named model.
+        """
+        start = time.perf_counter()
+        try:
+            with time_stage(f"{name}_inference"):
+                yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stat = self.stats[name]
+            with self._lock:
+                stat["inference_count"] += 1
+                stat["inference_seconds_total"] += elapsed
+                stat["inference_seconds_last"] = elapsed
+
+    def status(self):
+        models = {}
+        for name, stat in self.stats.items():
+            count = stat["inference_count"]
+            models[name] = dict(
+                stat,
+                inference_seconds_avg=(
+                    stat["inference_seconds_total"] / count if count else None
+                ),
+            )
+        return {
+            "ready": self.ready,
+            "rss_bytes": get_process_rss_bytes(),
+            "models": models,
+        }
+
+
+registry = ModelRegistry()
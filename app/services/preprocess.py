@@ -1,115 +1,148 @@
-import nest_asyncio
+import asyncio
+import codecs
+import os
 import re
-from llama_parse import LlamaParse
-from llama_index.core import Document, SimpleDirectoryReader, VectorStoreIndex
 from dotenv import load_dotenv
 
-from PyPDF2 import PdfReader
-from docx import Document
-
+from app.services.extraction import OCR_ENABLED, OCR_VERSION, iter_pdf_pages
+from app.services.sections import answer_locally, segment_sections
+from core.utils.disk import atomic_path
+from core.utils.document_cache import document_cache
+from core.utils.executors import run_io, run_parse
+from core.utils.llm_cache import llm_cache
+from core.utils.metrics import count_cache, time_stage
+from core.utils.reuse import content_key, intermediate_cache, record_reuse
+from core.utils.singleflight import SingleFlight
+from core.utils.staging import documents_digest, open_content
 
 load_dotenv()
 
+# Parsed and embedded RFP indexes are persisted here, keyed by document content hash
+INDEX_CACHE_DIR = os.environ.get("INDEX_CACHE_DIR", "data/indexes")
+
+# "llamaparse" parses documents for the RAG index remotely; "local" uses the local
+# extraction engine (parallel pages, OCR for scanned ones) and needs no remote parse
+DOCUMENT_PARSER = os.environ.get("DOCUMENT_PARSER", "llamaparse")
+
+# Answer queries from the document's own headings first (BM25 when there are none),
+# and only go to LlamaParse + the vector index when that answer is not confident
+SECTION_FAST_PATH = os.environ.get("SECTION_FAST_PATH", "1") == "1"
+SECTION_MIN_CONFIDENCE = float(os.environ.get("SECTION_MIN_CONFIDENCE", "0.5"))
+
+# Bump when text extraction changes, so cached extracted text is not reused
+EXTRACT_VERSION = f"2-{OCR_VERSION if OCR_ENABLED else 'no-ocr'}"
+
+# Page number headers/footers like "Page X of Y", "Page X-Y" and "Page X"
+PAGE_OF_PATTERN = re.compile(r"Page \d+ of \d+")
+PAGE_RANGE_PATTERN = re.compile(r"Page \d+-\d+")
+PAGE_PATTERN = re.compile(r"Page \d+")
+
+# Table debris: rows of only numbers and dashes, and divider rows of only dashes or pipes
+TABLE_ROW_PATTERN = re.compile(r"^(?:\d[\d\s-]*|[\-\|]+)$", flags=re.MULTILINE)
 
-# Apply nest_asyncio to allow nested event loops
-nest_asyncio.apply()
+# Encoding with this error handler replaces each run of non-ASCII characters with one
+# space, in C rather than a regex pass over the whole text
+codecs.register_error("ascii_space", lambda error: (" ", error.end))
 
 
 def clean_text(text):
     """
     Cleans the extracted text by removing unnecessary whitespace and newlines.
-    """
-    # Remove page number headers/footers like "Page X of Y"
-    text = re.sub(r"Page \d+ of \d+", "", text)
-    text = re.sub(r"Page \d+-\d+", "", text)
-    text = re.sub(r"Page \d+", "", text)
 
-    # 1. Remove lines that appear to be tables (based on multiple words separated by spaces or tabs)
-    # Match lines with multiple spaces or tabs (suggesting columns in a table)
-    # text = re.sub(r"^[^\n]*\s{2,}[^\n]*$", "", text, flags=re.MULTILINE)
+    Gives the same output as the original chain of re.sub calls (checked against the
+    golden corpus by benchmarks/clean_text.py) in a few passes over the text.
+    """
+    # The page patterns must run in this order: removing one match can complete
+    # another, as in "Page 1" + "Page 2 of 3" + "-4"
+    if "Page " in text:
+        text = PAGE_OF_PATTERN.sub("", text)
+        text = PAGE_RANGE_PATTERN.sub("", text)
+        text = PAGE_PATTERN.sub("", text)
+
+    # Numeric rows and divider rows never overlap, so one pass removes both
+    text = TABLE_ROW_PATTERN.sub("", text)
+
+    # Newlines, tabs and non-breaking spaces become spaces, and runs of spaces one space
+    text = text.strip()
+    text = text.replace("\n", " ").replace("\t", " ").replace("\xa0", " ")
+    while "  " in text:
+        text = text.replace("  ", " ")
+
+    # Remove non-ASCII characters (after collapsing, so they are not merged with the
+    # spaces around them)
+    if not text.isascii():
+        text = text.encode("ascii", errors="ascii_space").decode("ascii")
 
-    # 2. Remove rows that consist only of numbers or numbers and dashes (commonly in tables)
-    # Match rows of digits (potential numeric data rows in tables)
-    text = re.sub(r"^\d[\d\s-]*$", "", text, flags=re.MULTILINE)
+    return text
 
-    # 3. Remove lines containing table separators (like dashes or pipes, commonly used in table headers or dividers)
-    # Match lines that consist only of dashes or pipes
-    text = re.sub(r"^[\-\|]+$", "", text, flags=re.MULTILINE)
 
-    # 4. Clean up extra spaces or redundant line breaks after table removal
-    text = re.sub(r"\n+", "\n", text)  # Normalize line breaks
-    text = text.strip()  # Strip leading/trailing whitespace
+def clean_sections(text):
+    """
+    The cleaned text of each section of the raw extracted text, in order.
+    """
+    sections = [clean_text(section.text) for section in segment_sections(text)]
+    return [section for section in sections if section]
 
-    # Remove multiple newlines and extra spaces
-    # 1. Remove multiple line breaks and normalize to a single space
-    text = re.sub(r"\n+", " ", text)  # Replace multiple newlines with a single space
 
-    # 2. Replace tabs and special whitespace characters with a single space
-    text = re.sub(r"\t+", " ", text)  # Replace tabs with a single space
-    text = re.sub(r"\xa0", " ", text)  # Replace non-breaking spaces with normal spaces
+def read_docx_text(docx):
+    from docx import Document
 
-    # 3. Replace multiple consecutive spaces with a single space
-    text = re.sub(r" +", " ", text)  # Replace multiple spaces with a single space
+    with open_content(docx) as f:
+        doc = Document(f)
+    text = []
+    for para in doc.paragraphs:
+        text.append(para.text)
+    return "\n".join(text)
 
-    # 4. Strip leading and trailing spaces
-    # text = text.strip()  # Remove leading and trailing whitespace
 
-    # Remove special characters (e.g., non-breaking spaces or control characters)
-    text = re.sub(r"\xa0", " ", text)  # Replace non-breaking spaces
-    text = re.sub(r"[^\x00-\x7F]+", " ", text)  # Remove non-ASCII characters
+async def extract_text_from_pdf(document):
+    return "\n".join([text async for text in iter_pdf_pages(document)])
 
-    # Optionally, you could also remove extra punctuation marks or specific symbols
-    # text = re.sub(r'[^\w\s,.!?]', '', text)
 
-    return text
+async def extract_text_from_docx(docx):
+    return await run_parse(read_docx_text, docx)
 
 
-async def extract_text_from_pdf(pdf_path):
-    reader = PdfReader(pdf_path)
-    text = []
-    for page in reader.pages:
-        text.append(page.extract_text())
-    return "\n".join(text)
+# Extractions in progress, by content hash, shared by concurrent callers
+_extractions = SingleFlight()
 
 
-async def extract_text_from_docx(docx_path):
-    doc = Document(docx_path)
-    text = []
-    for para in doc.paragraphs:
-        text.append(para.text)
-    return "\n".join(text)
+async def extract_text(document, file_extension):
+    """
+    Raw text of a staged .pdf or .docx document, cached on disk by content hash.
 
+    The pipeline stages that need the text start together; they share one extraction.
+    """
+    text = await run_io(document_cache.get_text, document.digest, EXTRACT_VERSION)
+    if text is not None:
+        count_cache("text", "hit_disk")
+        return text
 
-async def get_from_file(
-    file_paths: list = [], file_extension: str = "pdf", option: str = "section"
-) -> str:
+    return await _extractions.do(
+        document.digest, lambda: _extract_text(document, file_extension)
+    )
 
-    # set up parser
-    parser = LlamaParse(result_type="text")  # "markdown" and "text" are available
 
-    file_extractor = {".pdf": parser}
+async def _extract_text(document, file_extension):
+    count_cache("text", "miss")
+    with time_stage("extract"):
+        if file_extension == ".pdf":
+            text = await extract_text_from_pdf(document)
+        else:
+            text = await extract_text_from_docx(document.content)
 
-    if file_extension == "docx":
-        # use SimpleDirectoryReader to parse our file
-        file_extractor = {".docx": parser}
-    documents = await SimpleDirectoryReader(
-        input_files=file_paths, file_extractor=file_extractor
-    ).aload_data()
+    await run_io(document_cache.set_text, document.digest, EXTRACT_VERSION, text)
+    return text
 
-    # create an index from the parsed markdown
-    index = VectorStoreIndex.from_documents(documents)
 
-    # create a query engine for the index
-    query_engine = index.as_query_engine()
+# Bump when QUERIES or the query engine settings change, so memoised answers are not reused
+QUERY_PROMPT_VERSION = "1"
 
-    # query the engine
-    if option == "tech":
-        query = """
+QUERIES = {
+    "tech": """
         What technical requirements and deliverables are needed for this rfp document?
-        """
-
-    elif option == "section":
-        query = """
+        """,
+    "section": """
         Classify each section of attached RFP document according to the categories provided as following. If section is provided, give detailed information from the document:
 
         Categories:
@@ -159,13 +192,240 @@ async def get_from_file(
             <Company Name>
             <Phone Number>
             <Email Address>
-        """
-
-    elif option == "budget":
-        query = """
+        """,
+    "budget": """
         What is the budget and pricing structure for this rfp document?
-        """
+        """,
+}
 
-    response = query_engine.query(query).response
 
-    return response
+def query_model_settings():
+    """
+    (model names, temperature) of the LLM and embedding model behind the query engine,
+    for memoisation keys.
+    """
+    # llama_index takes seconds to import; the web tier only pays for it once a
+    # query needs it (or when it is preloaded after startup)
+    from llama_index.core import Settings
+
+    names = []
+    temperature = None
+    for attr in ("llm", "embed_model"):
+        try:
+            model = getattr(Settings, attr)
+        except Exception:
+            # e.g. the default OpenAI model without an API key
+            names.append("default")
+            continue
+        names.append(model_name(model))
+        if attr == "llm":
+            temperature = getattr(model, "temperature", None)
+    return "/".join(names), temperature
+
+
+def model_name(model) -> str:
+    metadata = getattr(model, "metadata", None)
+    return (
+        getattr(metadata, "model_name", None)
+        or getattr(model, "model_name", None)
+        or type(model).__name__
+    )
+
+
+# Queries answered by the local section extractor vs. sent to RAG, per option
+local_answer_stats = {
+    "local": {option: 0 for option in QUERIES},
+    "rag": {option: 0 for option in QUERIES},
+}
+
+
+class DocumentSession:
+    """
+    Parses and indexes one staged RFP once and answers every query against it.
+
+    The index is persisted under INDEX_CACHE_DIR keyed by the document content hash,
+    so a re-upload of the same RFP skips LlamaParse and embedding entirely.
+    """
+
+    def __init__(
+        self,
+        documents: list,
+        file_extension: str = "pdf",
+        persist_dir: str = INDEX_CACHE_DIR,
+    ):
+        self.documents = documents
+        self.file_extension = file_extension.lstrip(".").lower()
+        self.persist_dir = persist_dir
+        self.content_hash = documents_digest(documents)
+        self.query_engine = None
+        self._lock = asyncio.Lock()
+
+    async def get_query_engine(self):
+        # Concurrent queries on the same session share a single parse/index pass
+        async with self._lock:
+            if self.query_engine is None:
+                index = await self._load_or_build_index()
+                self.query_engine = index.as_query_engine()
+        return self.query_engine
+
+    async def query(self, option: str = "section") -> str:
+        """
+        Answers one of QUERIES, memoised on the document content and query text.
+
+        A confident local answer, or a memoised one, skips parsing and indexing the
+        document altogether.
+        """
+        if SECTION_FAST_PATH:
+            answer = await self.answer_locally(option)
+            if answer is not None:
+                return answer
+
+        content_hash = self.content_hash
+        model, temperature = query_model_settings()
+        key = llm_cache.make_key(
+            "rag",
+            model,
+            temperature,
+            QUERY_PROMPT_VERSION,
+            f"{DOCUMENT_PARSER}\n{content_hash}\n{QUERIES[option]}",
+        )
+
+        async def call():
+            query_engine = await self.get_query_engine()
+            with time_stage("rag_query"):
+                response = await run_io(query_engine.query, QUERIES[option])
+            return response.response
+
+        return await llm_cache.get_or_call("rag", key, call)
+
+    async def answer_locally(self, option: str):
+        """
+        The local section extractor's answer, or None when its confidence is too low.
+        """
+        texts = [
+            await extract_text(document, f".{self.file_extension}")
+            for document in self.documents
+        ]
+        answer, confidence = await run_parse(answer_locally, "\n".join(texts), option)
+        local_answer_stats["local" if confidence >= SECTION_MIN_CONFIDENCE else "rag"][
+            option
+        ] += 1
+        if confidence < SECTION_MIN_CONFIDENCE:
+            return None
+        return answer
+
+    async def _load_or_build_index(self):
+        index_name = self.content_hash
+        if DOCUMENT_PARSER != "llamaparse":
+            index_name = f"{index_name}-{DOCUMENT_PARSER}"
+        index_dir = os.path.join(self.persist_dir, index_name)
+
+        if os.path.isdir(index_dir):
+            try:
+                index = await run_io(self._load_index, index_dir)
+                count_cache("index", "hit_disk")
+                return index
+            except Exception as e:
+                print(f"Error loading persisted index {index_dir}: {e}")
+        count_cache("index", "miss")
+
+        if DOCUMENT_PARSER == "local":
+            with time_stage("parse_local"):
+                documents = await self._parse_locally()
+        else:
+            from llama_parse import LlamaParse
+
+            # set up parser
+            parser = LlamaParse(
+                result_type="text"
+            )  # "markdown" and "text" are available
+
+            # Hand LlamaParse the staged bytes (or spooled file) directly
+            documents = []
+            with time_stage("llamaparse"):
+                for document in self.documents:
+                    documents.extend(
+                        await parser.aload_data(
+                            document.content, extra_info={"file_name": document.name}
+                        )
+                    )
+
+        index = await self._build_index(documents)
+        await run_io(self._persist, index, index_dir)
+
+        return index
+
+    async def _build_index(self, documents):
+        """
+        Splits the parsed documents into nodes and indexes them, embedding only the
+        nodes whose text has no cached embedding, e.g. those of the amended sections of
+        a revised RFP.
+        """
+        from llama_index.core import Settings, VectorStoreIndex
+        from llama_index.core.ingestion import run_transformations
+        from llama_index.core.schema import MetadataMode
+
+        for document in documents:
+            # Embed the text alone, so a node embeds the same in any revision
+            document.excluded_embed_metadata_keys = list(document.metadata)
+
+        nodes = await run_io(run_transformations, documents, Settings.transformations)
+        embed_model = Settings.embed_model
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        keys = [
+            content_key("embedding", model_name(embed_model), text) for text in texts
+        ]
+        cached = await intermediate_cache.get_many(keys)
+
+        missing = [index for index, key in enumerate(keys) if key not in cached]
+        # The embedding calls block
+        with time_stage("embed"):
+            embeddings = await run_io(
+                embed_model.get_text_embedding_batch,
+                [texts[index] for index in missing],
+            )
+        computed = dict(zip([keys[index] for index in missing], embeddings))
+        for node, key in zip(nodes, keys):
+            node.embedding = cached[key] if key in cached else computed[key]
+        record_reuse(
+            "embeddings", reused=len(nodes) - len(missing), computed=len(missing)
+        )
+
+        index = await run_io(VectorStoreIndex, nodes)
+        await intermediate_cache.set_many(computed)
+        return index
+
+    async def _parse_locally(self):
+        from llama_index.core import Document as IndexDocument
+
+        documents = []
+        for document in self.documents:
+            metadata = {"file_name": document.name}
+            if self.file_extension == "pdf":
+                index = 0
+                # Already counted when the document's text was extracted
+                async for text in iter_pdf_pages(document, count_reuse=False):
+                    index += 1
+                    documents.append(
+                        IndexDocument(
+                            text=text, metadata=dict(metadata, page_label=str(index))
+                        )
+                    )
+            else:
+                text = await extract_text_from_docx(document.content)
+                documents.append(IndexDocument(text=text, metadata=metadata))
+        return documents
+
+    def _load_index(self, index_dir):
+        from llama_index.core import StorageContext, load_index_from_storage
+
+        storage_context = StorageContext.from_defaults(persist_dir=index_dir)
+        return load_index_from_storage(storage_context)
+
+    def _persist(self, index, index_dir):
+        try:
+            with atomic_path(index_dir) as tmp_dir:
+                index.storage_context.persist(persist_dir=tmp_dir)
+        except OSError as e:
+            # Another request persisted the same document first, or the disk is read-only
+            print(f"Could not persist index {index_dir}: {e}")
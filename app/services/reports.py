@@ -0,0 +1,352 @@
+import asyncio
+import os
+
+from app.services.generate_compliance.generate_compliance import (
+    RESULT_VERSION as COMPLIANCE_VERSION,
+    score_compliance,
+)
+from app.services.generate_proposal.generate_proposal import (
+    RESULT_VERSION as PROPOSAL_VERSION,
+    generate_executive_summary,
+    run_proposal_pipeline,
+    stream_technical_content,
+)
+from app.services.preprocess import (
+    EXTRACT_VERSION,
+    DocumentSession,
+    clean_sections,
+    clean_text,
+    extract_text,
+)
+from app.services.sections import diff_sections, section_manifest
+from core.utils.cache import ResultCache
+from core.utils.document_cache import document_cache
+from core.utils.executors import run_io, run_parse
+from core.utils.metrics import time_stage
+from core.utils.reuse import intermediate_cache, track_reuse
+from core.utils.staging import documents_digest
+
+# Documents of one batch request staged or scored at once
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "8"))
+
+# Bump when section_manifest changes, so stored manifests are not compared against
+SECTIONS_VERSION = "1"
+
+# Generated results, in-process LRU in front of Redis (bound at startup)
+result_cache = ResultCache(
+    max_local_entries=int(os.environ.get("RESULT_CACHE_LOCAL_ENTRIES", "128")),
+    ttl=3600,  # 1-hour expiration
+)
+
+
+async def build_proposal(documents: list, file_extension: str):
+    """
+    Returns the rendered-ready proposal for a staged RFP and the per-stage timings.
+
+    Identical uploads share one cached result and one in-flight pipeline run, in which
+    case the timings are empty.
+    """
+    timings = {}
+
+    async def run_pipeline():
+        proposal, stage_timings = await run_proposal_pipeline(documents, file_extension)
+        timings.update(stage_timings)
+
+        proposal["technical_approach"] = proposal["technical_approach"].replace(
+            "\n", "<br/>"
+        )
+
+        proposal["budget_info"] = proposal["budget_info"].replace(r"\n", "<br />")
+
+        return proposal
+
+    cache_key = ResultCache.make_key(
+        "proposal", PROPOSAL_VERSION, documents_digest(documents)
+    )
+    proposal = await result_cache.get_or_compute(cache_key, run_pipeline)
+
+    return proposal, timings
+
+
+async def stream_proposal(documents: list, file_extension: str):
+    """
+    Yields (event, data) pairs for a proposal as each part becomes available.
+
+    "summary" arrives as soon as BART finishes, "budget" when the budget query returns,
+    and "technical" events carry technical-approach tokens as the chat model produces
+    them. Ends with "done", or "error" if a stage failed. The assembled proposal is
+    cached like build_proposal's, and a cached proposal is replayed at once.
+    """
+    cache_key = ResultCache.make_key(
+        "proposal", PROPOSAL_VERSION, documents_digest(documents)
+    )
+    proposal = await result_cache.get(cache_key)
+    if proposal is not None:
+        yield "summary", {"text": proposal["executive_summary"]}
+        yield "budget", {"html": proposal["budget_info"]}
+        yield "technical", {"text": proposal["technical_approach"]}
+        yield "done", {"cached": True}
+        return
+
+    session = DocumentSession(documents=documents, file_extension=file_extension)
+    events = asyncio.Queue()
+
+    async def summary():
+        raw = await extract_text(documents[0], file_extension)
+        with time_stage("clean"):
+            content = await run_parse(clean_text, raw)
+        with time_stage("sections"):
+            sections = await run_parse(clean_sections, raw)
+
+        executive_summary = await generate_executive_summary(content, sections)
+        await events.put(("summary", {"text": executive_summary}))
+        return executive_summary
+
+    async def budget():
+        budget_info = (await session.query("budget")).replace(r"\n", "<br />")
+        await events.put(("budget", {"html": budget_info}))
+        return budget_info
+
+    async def technical():
+        technical_requirements = await session.query("tech")
+        tokens = []
+        async for token in stream_technical_content(technical_requirements):
+            tokens.append(token)
+            await events.put(("technical", {"text": token}))
+        return "".join(tokens)
+
+    async def run(stage):
+        try:
+            return await stage()
+        finally:
+            # Marks the stage finished whether it succeeded or not
+            await events.put(None)
+
+    tasks = [
+        asyncio.ensure_future(run(stage)) for stage in (summary, budget, technical)
+    ]
+    try:
+        finished = 0
+        while finished < len(tasks):
+            event = await events.get()
+            if event is None:
+                finished += 1
+            else:
+                yield event
+
+        errors = [task.exception() for task in tasks if task.exception()]
+        if errors:
+            print(f"Error streaming proposal: {errors[0]}")
+            yield "error", {"detail": str(errors[0])}
+            return
+
+        executive_summary, budget_info, technical_approach = [
+            task.result() for task in tasks
+        ]
+        await result_cache.set(
+            cache_key,
+            {
+                "executive_summary": executive_summary,
+                "technical_approach": technical_approach.replace("\n", "<br/>"),
+                "budget_info": budget_info,
+            },
+        )
+        yield "done", {"cached": False}
+    finally:
+        # The client may disconnect mid-stream; stop the remaining work
+        for task in tasks:
+            task.cancel()
+
+
+async def compute_compliance_report(documents: list, file_extension: str):
+    """
+    Runs the compliance pipeline for a staged RFP, without the result cache.
+    """
+    session = DocumentSession(documents=documents, file_extension=file_extension)
+
+    response = await session.query("section")
+
+    compliance = await score_compliance(response)
+    compliance["report"] = compliance["report"].replace(r"\n", "<br />")
+    return compliance
+
+
+def compliance_cache_key(documents: list) -> str:
+    return ResultCache.make_key(
+        "compliance", COMPLIANCE_VERSION, documents_digest(documents)
+    )
+
+
+async def build_compliance_report(documents: list, file_extension: str):
+    """
+    Returns the rendered-ready compliance report for a staged RFP, with the scores of
+    each window of the document it was computed from.
+    """
+    return await result_cache.get_or_compute(
+        compliance_cache_key(documents),
+        lambda: compute_compliance_report(documents, file_extension),
+    )
+
+
+async def stream_compliance_batch(stagers: list):
+    """
+    Yields (index, outcome) for every document of a batch, in the order they finish.
+
+    `stagers` are async callables returning the StagedDocument of each document; the
+    documents are closed here. The outcome is the compliance report plus
+    "cached": bool, or {"error": detail} if that document failed.
+
+    Each document is staged as soon as a BATCH_CONCURRENCY slot frees up; the
+    documents staged together are looked up in the result cache in one pipelined round
+    trip, and their cached reports yielded right away. The rest are scored as they
+    come in, BATCH_CONCURRENCY at a time, so their extraction overlaps in the parse
+    pool and their windows share the compliance model's forward passes (see
+    generate_compliance.batcher). Identical documents are computed once, and new
+    reports are written back as they finish, those finishing together in one round
+    trip. Unlike build_compliance_report, misses take no cross-pod lock.
+    """
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+    documents = [None] * len(stagers)
+    runs = {}
+    computed = {}
+
+    async def stage(index):
+        try:
+            async with slots:
+                documents[index] = await stagers[index]()
+            return "staged", index, compliance_cache_key([documents[index]])
+        except Exception as e:
+            return "error", index, {"error": getattr(e, "detail", str(e))}
+
+    async def compute(key, document):
+        async with slots:
+            computed[key] = await compute_compliance_report(
+                [document], document.extension
+            )
+        return computed[key]
+
+    async def finish(index, key):
+        try:
+            outcome = dict(await asyncio.shield(runs[key]), cached=False)
+        except Exception as e:
+            print(f"Error scoring batch document {index}: {e}")
+            outcome = {"error": str(e)}
+        finally:
+            documents[index].close()
+        return "done", index, outcome
+
+    pending = {asyncio.ensure_future(stage(index)) for index in range(len(stagers))}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            staged = {}
+            for task in done:
+                status, index, result = task.result()
+                if status == "staged":
+                    staged[index] = result
+                else:
+                    yield index, result
+
+            if staged:
+                try:
+                    cached = await result_cache.get_many(list(staged.values()))
+                except Exception as e:
+                    print(f"Error looking up {len(staged)} batch documents: {e}")
+                    cached = None
+                for index, key in staged.items():
+                    if cached is None:
+                        documents[index].close()
+                        yield index, {"error": "Result cache lookup failed"}
+                    elif key in cached:
+                        documents[index].close()
+                        yield index, dict(cached[key], cached=True)
+                    else:
+                        # One run per distinct document; duplicates wait on the same run
+                        if key not in runs:
+                            runs[key] = asyncio.ensure_future(
+                                compute(key, documents[index])
+                            )
+                        pending.add(asyncio.ensure_future(finish(index, key)))
+
+            if computed:
+                # Written back as they finish, so other requests (and a retry after
+                # this pod dies) find them without waiting for the whole batch
+                finished, computed = computed, {}
+                await result_cache.set_many(finished)
+    finally:
+        for task in [*pending, *runs.values()]:
+            task.cancel()
+        for document in documents:
+            if document is not None:
+                document.close()
+        if computed:
+            # The client went away mid-batch: keep the reports already finished
+            asyncio.ensure_future(result_cache.set_many(computed))
+
+
+def manifest_key(digest: str) -> str:
+    return ResultCache.make_key("sections", SECTIONS_VERSION, digest)
+
+
+async def load_section_manifest(digest: str):
+    """
+    Section manifest of an earlier upload, by its content digest, or None if unknown.
+
+    Manifests are stored by build_revision; failing that, one is rebuilt from the
+    document's extracted text if this pod still has it on disk.
+    """
+    manifest = await intermediate_cache.get(manifest_key(digest))
+    if manifest is not None:
+        return manifest
+    text = await run_io(document_cache.get_text, digest, EXTRACT_VERSION)
+    if text is None:
+        return None
+    return await run_parse(section_manifest, text)
+
+
+async def build_revision(
+    documents: list, file_extension: str, kind: str, previous: list = None
+):
+    """
+    Runs the `kind` pipeline ("proposal" or "compliance") on a staged RFP, reporting
+    how it differs from an earlier version and how much work was reused.
+
+    `previous` is the section manifest of the earlier version (load_section_manifest).
+    Page texts, embeddings, chunk summaries and compliance window logits are cached by
+    content, so only the sections that changed are extracted, embedded, summarised
+    and scored again; "reuse" counts, per kind of work, what came from the cache.
+    """
+    digest = documents_digest(documents)
+    with track_reuse() as reuse:
+        texts = [await extract_text(document, file_extension) for document in documents]
+        manifest = await run_parse(section_manifest, "\n".join(texts))
+        await intermediate_cache.set(manifest_key(digest), manifest)
+
+        if kind == "proposal":
+            cached = await result_cache.get(
+                ResultCache.make_key("proposal", PROPOSAL_VERSION, digest)
+            )
+            result = cached or (await build_proposal(documents, file_extension))[0]
+        else:
+            cached = await result_cache.get(compliance_cache_key(documents))
+            result = cached or await build_compliance_report(documents, file_extension)
+
+    changes = None
+    sections = manifest
+    if previous is not None:
+        sections = diff_sections(previous, manifest)
+        changes = {
+            status: sum(section["status"] == status for section in sections)
+            for status in ("unchanged", "changed", "added", "removed")
+        }
+
+    return {
+        "digest": digest,
+        kind: result,
+        "cached": cached is not None,
+        "sections": sections,
+        "changes": changes,
+        "reuse": reuse.as_dict(),
+    }
@@ -0,0 +1,442 @@
+import difflib
+import hashlib
+import math
+import re
+from collections import Counter
+
+# Heading phrases for the compliance categories asked about by QUERIES["section"],
+# in the same order and numbering
+CATEGORIES = [
+    (
+        "Introduction",
+        ["introduction", "purpose", "background", "overview", "scope of the rfp"],
+    ),
+    ("Objectives", ["objectives", "project goals", "goals", "expected outcomes"]),
+    (
+        "Scope of Work",
+        [
+            "scope of work",
+            "statement of work",
+            "deliverables",
+            "project requirements",
+            "technical requirements",
+            "specifications",
+        ],
+    ),
+    (
+        "Eligibility Criteria",
+        [
+            "eligibility",
+            "vendor qualifications",
+            "qualifications",
+            "financial stability",
+            "references",
+            "minimum requirements",
+        ],
+    ),
+    (
+        "Proposal Instructions",
+        [
+            "proposal instructions",
+            "proposal submission",
+            "submission",
+            "proposal format",
+            "questions and clarifications",
+            "instructions to offerors",
+            "instructions to bidders",
+        ],
+    ),
+    (
+        "Evaluation Criteria",
+        [
+            "evaluation criteria",
+            "evaluation process",
+            "evaluation",
+            "scoring",
+            "basis for award",
+        ],
+    ),
+    (
+        "Budget and Pricing",
+        [
+            "budget",
+            "pricing",
+            "price",
+            "cost proposal",
+            "payment terms",
+            "compensation",
+            "fees",
+        ],
+    ),
+    (
+        "Timeline",
+        [
+            "timeline",
+            "schedule",
+            "milestones",
+            "deliverable deadlines",
+            "key dates",
+            "period of performance",
+        ],
+    ),
+    (
+        "Terms and Conditions",
+        [
+            "terms and conditions",
+            "confidentiality",
+            "indemnification",
+            "governing law",
+            "contractual",
+            "insurance",
+        ],
+    ),
+    (
+        "Contact Information",
+        ["contact information", "point of contact", "contact", "inquiries"],
+    ),
+]
+
+# Headings and search terms answering the "tech" and "budget" queries
+OPTIONS = {
+    "tech": {
+        "headings": [
+            "scope of work",
+            "statement of work",
+            "technical requirements",
+            "deliverables",
+            "project requirements",
+            "specifications",
+            "requirements",
+        ],
+        "terms": "technical requirements deliverables scope work specifications system functional performance",
+    },
+    "budget": {
+        "headings": [
+            "budget",
+            "pricing",
+            "price",
+            "cost proposal",
+            "payment terms",
+            "compensation",
+            "fees",
+        ],
+        "terms": "budget pricing price cost payment fee compensation not exceed funding",
+    },
+}
+
+# Characters of section text returned for the "tech" and "budget" queries
+MAX_ANSWER_CHARS = 6000
+
+STOPWORDS = set(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+NUMBERED_HEADING = re.compile(
+    r"^\s*(?:(?i:section|article|part)\s+)?"
+    r"(?P<number>\d+(?:\.\d+)*|[IVX]+)[.)]?\s+(?P<title>[A-Z][^\n]{2,80})$"
+)
+CAPS_HEADING = re.compile(r"^\s*(?P<title>[A-Z][A-Z0-9 &/,()\-]{3,80})\s*$")
+
+
+class Section:
+    def __init__(self, title, number=None, level=1):
+        self.title = title
+        self.number = number
+        self.level = level
+        self.lines = []
+
+    @property
+    def body(self):
+        return "\n".join(self.lines).strip()
+
+    @property
+    def text(self):
+        return f"{self.title}\n{self.body}".strip()
+
+
+def tokenize(text):
+    return [
+        token
+        for token in re.findall(r"[a-z0-9]+", text.lower())
+        if token not in STOPWORDS
+    ]
+
+
+def contains_phrase(title, phrases):
+    """
+    Whether the heading `title` contains one of `phrases`, compared word by word.
+    """
+    title = f" {' '.join(tokenize(title))} "
+    return any(f" {' '.join(tokenize(phrase))} " in title for phrase in phrases)
+
+
+def match_heading(line):
+    """
+    (number, title, level) if `line` looks like a section heading, else None.
+    """
+    if len(line) > 100:
+        return None
+
+    match = NUMBERED_HEADING.match(line)
+    if match:
+        title = match.group("title").strip()
+        # A numbered sentence ("1. The vendor shall ...") is a list item, not a heading
+        if len(title.split()) <= 12 and not title.endswith((".", ",", ";")):
+            number = match.group("number")
+            return number, title, number.count(".") + 1
+
+    match = CAPS_HEADING.match(line)
+    if match and len(match.group("title").split()) <= 12:
+        return None, match.group("title").strip(), 1
+
+    # Unnumbered title-case headings, recognised by their wording
+    stripped = line.strip().rstrip(":")
+    words = stripped.split()
+    if (
+        0 < len(words) <= 6
+        and all(word[0].isupper() for word in words if len(word) > 3)
+        and not re.search(r"[\d$:]", stripped)
+        and not stripped.endswith(".")
+        and heading_category(stripped) is not None
+    ):
+        return None, stripped, 1
+    return None
+
+
+def segment_sections(text):
+    """
+    Splits extracted RFP text into sections at the lines that look like headings.
+
+    Text before the first heading is kept as an untitled leading section.
+    """
+    sections = [Section("", level=0)]
+    for line in text.splitlines():
+        heading = match_heading(line)
+        if heading is None:
+            sections[-1].lines.append(line)
+            continue
+        number, title, level = heading
+        sections.append(Section(title, number, level))
+    return [section for section in sections if section.title or section.body]
+
+
+def section_digest(section) -> str:
+    """
+    SHA-256 of a section's heading and text, ignoring how whitespace is laid out.
+    """
+    return hashlib.sha256(" ".join(section.text.split()).encode("utf-8")).hexdigest()
+
+
+def section_manifest(text):
+    """
+    The sections of extracted RFP text in order, each as {"number", "title", "digest",
+    "chars"}: what a later revision of the document is compared against.
+    """
+    return [
+        {
+            "number": section.number,
+            "title": section.title,
+            "digest": section_digest(section),
+            "chars": len(section.text),
+        }
+        for section in segment_sections(text)
+    ]
+
+
+def diff_sections(previous, current):
+    """
+    Compares two section manifests, matching identical sections first and then the
+    remaining ones by heading.
+
+    Returns the sections of `current`, each with a "status" of "unchanged", "changed"
+    or "added", followed by the sections of `previous` that are gone ("removed").
+    """
+    statuses = ["added"] * len(current)
+    matched = set()
+    matcher = difflib.SequenceMatcher(
+        a=[section["digest"] for section in previous],
+        b=[section["digest"] for section in current],
+        autojunk=False,
+    )
+    for block in matcher.get_matching_blocks():
+        for offset in range(block.size):
+            statuses[block.b + offset] = "unchanged"
+            matched.add(block.a + offset)
+
+    # An edited section keeps its heading; pair them up in document order
+    unmatched = {}
+    for index, section in enumerate(previous):
+        if index not in matched:
+            unmatched.setdefault((section["number"], section["title"]), []).append(
+                index
+            )
+    for index, section in enumerate(current):
+        if statuses[index] != "added":
+            continue
+        candidates = unmatched.get((section["number"], section["title"]))
+        if candidates:
+            matched.add(candidates.pop(0))
+            statuses[index] = "changed"
+
+    return [
+        dict(section, status=status) for section, status in zip(current, statuses)
+    ] + [
+        dict(section, status="removed")
+        for index, section in enumerate(previous)
+        if index not in matched
+    ]
+
+
+def heading_category(title):
+    """
+    Index into CATEGORIES of the category a heading names, or None.
+    """
+    for index, (_, phrases) in enumerate(CATEGORIES):
+        if contains_phrase(title, phrases):
+            return index
+    return None
+
+
+def with_subsections(sections, index):
+    """
+    The section at `index` followed by its numbered subsections (3 -> 3.1, 3.2, ...).
+    """
+    section = sections[index]
+    selected = [section]
+    for following in sections[index + 1 :]:
+        if (
+            section.number
+            and following.number
+            and following.number.startswith(section.number + ".")
+        ):
+            selected.append(following)
+        elif following.level > section.level:
+            selected.append(following)
+        else:
+            break
+    return selected
+
+
+class BM25:
+    """
+    Okapi BM25 over a fixed list of documents.
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents = [Counter(tokenize(document)) for document in documents]
+        self.lengths = [sum(counts.values()) for counts in self.documents]
+        self.average_length = sum(self.lengths) / max(len(self.lengths), 1)
+        frequencies = Counter(
+            term for counts in self.documents for term in counts.keys()
+        )
+        total = len(self.documents)
+        self.idf = {
+            term: math.log(1 + (total - count + 0.5) / (count + 0.5))
+            for term, count in frequencies.items()
+        }
+
+    def scores(self, query):
+        terms = tokenize(query)
+        scores = []
+        for counts, length in zip(self.documents, self.lengths):
+            score = 0.0
+            for term in terms:
+                frequency = counts.get(term, 0)
+                if not frequency:
+                    continue
+                norm = self.k1 * (
+                    1 - self.b + self.b * length / (self.average_length or 1)
+                )
+                score += self.idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            scores.append(score)
+        return scores
+
+
+def chunk_text(text, words_per_chunk=200):
+    words = text.split()
+    return [
+        " ".join(words[start : start + words_per_chunk])
+        for start in range(0, len(words), words_per_chunk)
+    ]
+
+
+def answer_option(text, option):
+    """
+    Answers the "tech" or "budget" query from the document's own sections.
+
+    Returns (answer, confidence in [0, 1]). Sections under a matching heading are
+    answered with full confidence; otherwise the best BM25 passage is returned with
+    the share of search terms it contains, capped below a heading match.
+    """
+    spec = OPTIONS[option]
+    sections = segment_sections(text)
+
+    matched = []
+    for index, section in enumerate(sections):
+        if section.title and contains_phrase(section.title, spec["headings"]):
+            if not any(section in group for group in matched):
+                matched.append(with_subsections(sections, index))
+    if matched:
+        answer = "\n\n".join(section.text for group in matched for section in group)
+        return answer[:MAX_ANSWER_CHARS], 1.0
+
+    passages = [section.text for section in sections if section.body]
+    if len(passages) <= 1:
+        passages = chunk_text(text)
+    if not passages:
+        return "", 0.0
+
+    scores = BM25(passages).scores(spec["terms"])
+    best = max(range(len(passages)), key=scores.__getitem__)
+    if scores[best] <= 0:
+        return "", 0.0
+
+    terms = set(tokenize(spec["terms"]))
+    coverage = len(terms & set(tokenize(passages[best]))) / len(terms)
+    return passages[best][:MAX_ANSWER_CHARS], min(coverage, 0.9)
+
+
+def answer_sections(text, max_category_chars=None):
+    """
+    Answers the "section" query: each compliance category with the text found under it.
+
+    The answer is what the compliance classifier scores, window by window, so each
+    category keeps its full text unless `max_category_chars` cuts it short for display.
+
+    Returns (answer, confidence), the confidence being the share of categories whose
+    heading was found.
+    """
+    sections = segment_sections(text)
+    found = {}
+    included = set()
+    for index, section in enumerate(sections):
+        if id(section) in included or not section.title:
+            continue
+        category = heading_category(section.title)
+        if category is None:
+            continue
+        group = with_subsections(sections, index)
+        included.update(id(member) for member in group)
+        found.setdefault(category, []).extend(group)
+
+    lines = []
+    for index, (name, _) in enumerate(CATEGORIES):
+        group = found.get(index)
+        if group:
+            details = " ".join(" ".join(section.text.split()) for section in group)
+            lines.append(f"{index + 1}. {name}: {details[:max_category_chars]}")
+        else:
+            lines.append(f"{index + 1}. {name}: Not provided in the document.")
+
+    return "\n".join(lines), len(found) / len(CATEGORIES)
+
+
+def answer_locally(text, option):
+    """
+    (answer, confidence) for one of the QUERIES options from the document text alone.
+    """
+    if option == "section":
+        return answer_sections(text)
+    return answer_option(text, option)
@@ -0,0 +1,193 @@
+"""
+Text cleaning throughput (MB/s) and peak memory, against the original implementation.
+
+First checks clean_text against the golden corpus in benchmarks/golden/clean_text
+(each <name>.txt input next to its <name>.expected.txt output, produced by the
+original multi-pass cleaner), then times both cleaners on synthetic extracted text of
+increasing length:
+
+    python -m benchmarks.clean_text --pages 10 100 1000 --repeat 5
+
+Regenerate the golden outputs with the original cleaner (only needed when the
+cleaning rules change on purpose):
+
+    python -m benchmarks.clean_text --update
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+
+from app.services.preprocess import clean_text
+from benchmarks.corpus import synthetic_pages
+
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), "golden", "clean_text")
+
+
+def reference_clean_text(text):
+    """
+    clean_text as it was before the single-pass rewrite, kept as the reference output.
+    """
+    text = re.sub(r"Page \d+ of \d+", "", text)
+    text = re.sub(r"Page \d+-\d+", "", text)
+    text = re.sub(r"Page \d+", "", text)
+    text = re.sub(r"^\d[\d\s-]*$", "", text, flags=re.MULTILINE)
+    text = re.sub(r"^[\-\|]+$", "", text, flags=re.MULTILINE)
+    text = re.sub(r"\n+", "\n", text)
+    text = text.strip()
+    text = re.sub(r"\n+", " ", text)
+    text = re.sub(r"\t+", " ", text)
+    text = re.sub(r"\xa0", " ", text)
+    text = re.sub(r" +", " ", text)
+    text = re.sub(r"\xa0", " ", text)
+    text = re.sub(r"[^\x00-\x7F]+", " ", text)
+    return text
+
+
+def extracted_text(pages: int, seed: int = 0) -> str:
+    """
+    Synthetic RFP text with the debris PDF extraction leaves behind: page footers,
+    table rows and dividers, tabs, non-breaking spaces and non-ASCII punctuation.
+    """
+    rng = random.Random(seed)
+    result = []
+    for page, text in enumerate(synthetic_pages(pages, seed=seed)):
+        lines = text.split("\n")
+        lines.insert(2, "Item\tQty\tUnit\xa0Price")
+        lines.insert(3, "-" * 24)
+        lines.insert(4, f"{rng.randint(1, 99)}  {rng.randint(1, 999)} - {page}")
+        lines.insert(6, "|" * 3)
+        lines[7] = lines[7].replace(" ", "\xa0", 3) + " — see “Attachment A”"
+        lines.append("")
+        lines.append(f"Page {page + 1}-{pages}")
+        result.append("\n".join(lines))
+    return "\n\n".join(result)
+
+
+def golden_inputs() -> dict:
+    """
+    Inputs of the golden corpus, by name.
+    """
+    return {
+        "synthetic": "\n".join(synthetic_pages(5)),
+        "extracted": extracted_text(5),
+        "edge_cases": "\n".join(
+            [
+                "  \n\t Page 1 of 2 \xa0",
+                "Page 1Page 2 of 3-4",
+                "Page 12-13 continues Page 7 and Page ",
+                "2024",
+                "1 - 2 - 3",
+                "1\t2",
+                "---|---",
+                "-1",
+                "| a | b |",
+                "Total: $1,200",
+                "café naïve    résumé\t\t x",
+                "\r\nline\r",
+                "",
+                "\n\n\n",
+                "end é",
+            ]
+        ),
+        "empty": "",
+    }
+
+
+def update_golden():
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    for name, text in golden_inputs().items():
+        for suffix, content in (
+            (".txt", text),
+            (".expected.txt", reference_clean_text(text)),
+        ):
+            with open(
+                os.path.join(GOLDEN_DIR, name + suffix),
+                "w",
+                encoding="utf-8",
+                newline="",
+            ) as f:
+                f.write(content)
+        print(f"Wrote {name}")
+
+
+def check_golden() -> bool:
+    names = sorted(
+        name[: -len(".expected.txt")]
+        for name in os.listdir(GOLDEN_DIR)
+        if name.endswith(".expected.txt")
+    )
+    passed = True
+    for name in names:
+        with open(
+            os.path.join(GOLDEN_DIR, name + ".txt"), encoding="utf-8", newline=""
+        ) as f:
+            text = f.read()
+        with open(
+            os.path.join(GOLDEN_DIR, name + ".expected.txt"),
+            encoding="utf-8",
+            newline="",
+        ) as f:
+            expected = f.read()
+        if clean_text(text) != expected:
+            print(f"golden {name}: MISMATCH")
+            passed = False
+        else:
+            print(f"golden {name}: ok")
+    return passed
+
+
+def measure(function, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(text)
+    seconds = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    function(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--update", action="store_true")
+    args = parser.parse_args()
+
+    if args.update:
+        update_golden()
+        return 0
+    if not check_golden():
+        return 1
+
+    print(
+        f"{'pages':>6} {'MB':>7} {'cleaner':<10} {'seconds':>9} {'MB/s':>8} {'peak MB':>8}"
+    )
+    for pages in args.pages:
+        text = extracted_text(pages)
+        if clean_text(text) != reference_clean_text(text):
+            print(f"{pages} pages: output differs from the reference")
+            return 1
+
+        megabytes = len(text.encode("utf-8")) / 1024**2
+        for name, function in (
+            ("reference", reference_clean_text),
+            ("current", clean_text),
+        ):
+            seconds, peak = measure(function, text, args.repeat)
+            print(
+                f"{pages:>6} {megabytes:>7.2f} {name:<10} {seconds:>9.4f} "
+                f"{megabytes / seconds:>8.1f} {peak / 1024**2:>8.2f}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
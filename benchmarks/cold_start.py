@@ -0,0 +1,102 @@
+"""
+Cold-start cost of the web tier, broken down by import.
+
+Imports app.server in fresh interpreters under `python -X importtime` and reports the
+wall time and the modules that took longest, cumulatively (a module's time includes
+everything it imported first):
+
+    python -m benchmarks.cold_start --repeat 5 --top 20
+
+It exits non-zero if importing the server pulled in one of the heavy libraries the
+pipelines are meant to import only after startup (app.server.PIPELINE_MODULES), or if
+--max-seconds is given and the median import took longer.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+from benchmarks.load_test import percentile
+
+# Prints the wall time of the import and which of the pipeline libraries it loaded
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import app.server
+elapsed = time.perf_counter() - start
+loaded = [name for name in app.server.PIPELINE_MODULES if name in sys.modules]
+print(f"{elapsed} {','.join(loaded)}")
+"""
+
+
+def parse_importtime(stderr: str) -> dict:
+    """
+    Cumulative import time in seconds per module, from `python -X importtime` output.
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, self_us, cumulative_us, name = [
+            part.strip() for part in line.replace("import time:", "|").split("|")
+        ]
+        if not cumulative_us.isdigit():
+            # The header line
+            continue
+        modules[name] = max(modules.get(name, 0.0), int(cumulative_us) / 1e6)
+    return modules
+
+
+def probe_once():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    elapsed, _, loaded = result.stdout.strip().rpartition("\n")[-1].partition(" ")
+    return float(elapsed), [name for name in loaded.split(",") if name], result.stderr
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--max-seconds", type=float)
+    args = parser.parse_args()
+
+    timings = []
+    modules = {}
+    loaded = set()
+    for _ in range(args.repeat):
+        elapsed, pipeline_modules, stderr = probe_once()
+        timings.append(elapsed)
+        loaded.update(pipeline_modules)
+        for name, seconds in parse_importtime(stderr).items():
+            modules.setdefault(name, []).append(seconds)
+
+    median = statistics.median(timings)
+    print(
+        f"import app.server: median {median:.3f}s, p95 {percentile(timings, 95):.3f}s "
+        f"over {args.repeat} runs (with -X importtime overhead)"
+    )
+    print(f"\n{'module':<50} {'cumulative s':>12}")
+    medians = {name: statistics.median(seconds) for name, seconds in modules.items()}
+    for name in sorted(medians, key=medians.get, reverse=True)[: args.top]:
+        print(f"{name:<50} {medians[name]:>12.3f}")
+
+    failed = False
+    if loaded:
+        print(f"\nPipeline libraries imported at server start: {', '.join(loaded)}")
+        failed = True
+    if args.max_seconds is not None and median > args.max_seconds:
+        print(f"\nMedian import time is over {args.max_seconds}s")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
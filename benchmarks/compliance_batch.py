@@ -0,0 +1,150 @@
+"""
+Throughput of the batch compliance endpoint against one request per document, offline.
+
+Runs app.server:app in-process against the local stand-ins (see benchmarks/standins.py)
+and scores the same number of new synthetic RFPs three ways: one
+/generate/compliance-report/ call after another, --concurrency of those calls at a
+time, and a single /generate/compliance-report/batch/ call:
+
+    python -m benchmarks.compliance_batch --documents 32 --pages 10 --concurrency 8
+
+Every run uses documents the server has not seen, so nothing is served from cache.
+Reports documents per second and, for the batch, the time to its first result.
+"""
+
+import argparse
+import asyncio
+import json
+import shutil
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks import standins
+from benchmarks.load_test import MIME_TYPES, build_document
+
+
+class Documents:
+    """
+    New documents on every call, alternating formats.
+    """
+
+    def __init__(self, formats, pages):
+        self.formats = formats
+        self.pages = pages
+        self.seed = 0
+
+    def take(self, count):
+        documents = []
+        for _ in range(count):
+            fmt = self.formats[self.seed % len(self.formats)]
+            data = build_document(fmt, self.pages, seed=self.seed)
+            documents.append((f"rfp-{self.seed}.{fmt}", data, MIME_TYPES[fmt]))
+            self.seed += 1
+        return documents
+
+
+async def one_per_request(client, documents, concurrency):
+    queue = list(documents)
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            response = await client.post(
+                "/generate/compliance-report/", files={"file": queue.pop()}
+            )
+            errors += response.status_code != 200
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return errors, None
+
+
+async def batch(client, documents):
+    errors = 0
+    first = None
+    start = time.perf_counter()
+    async with client.stream(
+        "POST",
+        "/generate/compliance-report/batch/",
+        files=[("files", document) for document in documents],
+    ) as response:
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            outcome = json.loads(line)
+            if outcome.get("done"):
+                break
+            if first is None:
+                first = time.perf_counter() - start
+            errors += "error" in outcome
+    return errors, first
+
+
+async def run(args, work_dir):
+    server = standins.install(work_dir, redis_url=args.redis_url)
+    await server.startup_event()
+    if server.preload_task is not None:
+        await server.preload_task
+    if not server.registry.ready:
+        print(f"Stand-in models failed to load: {server.registry.status()}")
+        return 1
+
+    documents = Documents(args.formats, args.pages)
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark", timeout=None
+    ) as client:
+        # Start the process pools before measuring
+        await batch(client, documents.take(2))
+
+        modes = [
+            ("sequential", lambda docs: one_per_request(client, docs, 1)),
+            (
+                f"concurrent x{args.concurrency}",
+                lambda docs: one_per_request(client, docs, args.concurrency),
+            ),
+            ("batch", lambda docs: batch(client, docs)),
+        ]
+        print(
+            f"{'mode':<16} {'docs':>5} {'errs':>5} {'seconds':>8} {'docs/s':>7} "
+            f"{'first s':>8}"
+        )
+        failed = False
+        for name, mode in modes:
+            start = time.perf_counter()
+            errors, first = await mode(documents.take(args.documents))
+            elapsed = time.perf_counter() - start
+            failed = failed or errors
+            print(
+                f"{name:<16} {args.documents:>5} {errors:>5} {elapsed:>8.2f} "
+                f"{args.documents / elapsed:>7.2f} "
+                f"{'' if first is None else f'{first:.2f}':>8}"
+            )
+
+    await server.shutdown_event()
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--documents", type=int, default=32)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--formats", nargs="+", default=["pdf", "docx"])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--redis-url", help="local Redis to use instead of fakeredis")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="rfp-benchmark-")
+    try:
+        return asyncio.run(run(args, work_dir))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import io
+import random
+
+from docx import Document
+
+WORDS = (
+    "the contractor shall provide design development deployment maintenance support "
+    "services for the agency including user training documentation and reporting "
+    "deliverables milestones schedule budget pricing payment terms evaluation criteria "
+    "proposal submission vendor qualifications financial stability references scope "
+    "of work requirements performance security compliance data system integration "
+    "testing acceptance timeline project management quality assurance"
+).split()
+
+HEADINGS = [
+    "Introduction",
+    "Background",
+    "Scope of Work",
+    "Deliverables",
+    "Timeline",
+    "Eligibility Criteria",
+    "Proposal Instructions",
+    "Evaluation Criteria",
+    "Budget and Pricing",
+    "Terms and Conditions",
+    "Contact Information",
+]
+
+
+def synthetic_pages(
+    pages: int, words_per_page: int = 450, seed: int = 0, amended: tuple = ()
+) -> list:
+    """
+    Deterministic RFP-like pages of text, with numbered section headings.
+
+    The pages whose indexes are in `amended` get different text, as in a re-issued RFP;
+    the other pages are the same as without it.
+    """
+    rng = random.Random(seed)
+    result = []
+    for page in range(pages):
+        lines = [f"{page % len(HEADINGS) + 1}. {HEADINGS[page % len(HEADINGS)]}"]
+        words = [rng.choice(WORDS) for _ in range(words_per_page)]
+        if page in amended:
+            amendment = random.Random(f"{seed}-{page}")
+            words = [amendment.choice(WORDS) for _ in range(words_per_page)]
+        for start in range(0, len(words), 15):
+            lines.append(" ".join(words[start : start + 15]).capitalize() + ".")
+        lines.append(f"Page {page + 1} of {pages}")
+        result.append("\n".join(lines))
+    return result
+
+
+def vocabulary() -> list:
+    """
+    Every word the synthetic pages are made of, for stand-in tokenizers.
+    """
+    words = set(WORDS)
+    for heading in HEADINGS:
+        words.update(heading.lower().split())
+    words.update(["page", "of"])
+    return sorted(words)
+
+
+def escape_pdf_text(line: str) -> bytes:
+    line = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return line.encode("latin-1", errors="replace")
+
+
+def synthetic_pdf(pages: int, seed: int = 0, amended: tuple = ()) -> bytes:
+    """
+    A PDF of synthetic_pages with a real text layer, one page per page of text.
+    """
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    kids = []
+    number = 4
+    for text in synthetic_pages(pages, seed=seed, amended=amended):
+        stream = b"BT /F1 9 Tf 40 760 Td 11 TL "
+        stream += b" ".join(
+            b"(" + escape_pdf_text(line) + b") Tj T*" for line in text.split("\n")
+        )
+        stream += b" ET"
+        objects[number] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (number + 1)
+        )
+        objects[number + 1] = (
+            b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        )
+        kids.append(number)
+        number += 2
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids),
+        len(kids),
+    )
+
+    pdf = b"%PDF-1.4\n"
+    offsets = {}
+    for index in sorted(objects):
+        offsets[index] = len(pdf)
+        pdf += b"%d 0 obj\n" % index + objects[index] + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % number
+    pdf += b"".join(b"%010d 00000 n \n" % offsets[index] for index in range(1, number))
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        number,
+        xref,
+    )
+    return pdf
+
+
+def synthetic_docx(pages: int, seed: int = 0, amended: tuple = ()) -> bytes:
+    """
+    A .docx of synthetic_pages, one paragraph per line.
+    """
+    document = Document()
+    for text in synthetic_pages(pages, seed=seed, amended=amended):
+        for line in text.split("\n"):
+            document.add_paragraph(line)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,264 @@
+"""
+End-to-end latency and throughput of app.server:app, offline.
+
+Runs the app in-process against local stand-ins (see benchmarks/standins.py) and
+replays a corpus of synthetic PDF and DOCX RFPs of several sizes at each concurrency
+level, reporting p50/p95/p99 latency, requests per second, peak RSS and the per-stage
+breakdown from the Server-Timing header:
+
+    python -m benchmarks.load_test --endpoint proposal --pages 2 10 50 \\
+        --concurrency 1 4 16 --requests 32
+
+With --cache cold (the default) every request sends a document the server has not
+seen, so nothing is served from the result, LLM, text or index caches (one request
+warms up the process pools first); with --cache warm the corpus is replayed once
+before measuring. --source file_key uploads the corpus to the in-memory S3 first and
+generates from the file keys. --json writes the results for comparison between runs.
+"""
+
+import argparse
+import asyncio
+import json
+import shutil
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks import standins
+from benchmarks.corpus import synthetic_docx, synthetic_pdf
+from core.utils.misc import get_peak_rss_bytes
+
+ENDPOINTS = {
+    "proposal": "/generate/proposal/",
+    "compliance": "/generate/compliance-report/",
+}
+
+MIME_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+
+def build_document(fmt: str, pages: int, seed: int, amended: tuple = ()) -> bytes:
+    if fmt == "pdf":
+        return synthetic_pdf(pages, seed=seed, amended=amended)
+    return synthetic_docx(pages, seed=seed, amended=amended)
+
+
+def percentile(values: list, q: float) -> float:
+    """
+    Nearest-rank percentile of `values`, q in [0, 100].
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return float("nan")
+    rank = max(int(round(q / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def parse_server_timing(header: str) -> dict:
+    """
+    Stage durations in seconds from a Server-Timing header value.
+    """
+    stages = {}
+    for entry in filter(None, (part.strip() for part in header.split(","))):
+        name, _, params = entry.partition(";")
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip() == "dur":
+                stages[name.strip()] = float(value) / 1000
+    return stages
+
+
+class Corpus:
+    """
+    The request bodies to replay: one document per (format, size), or a fresh one for
+    every request in cold mode.
+    """
+
+    def __init__(self, formats, pages, cold):
+        self.specs = [(fmt, count) for fmt in formats for count in pages]
+        self.cold = cold
+        self.issued = 0
+        self._documents = {}
+
+    def next(self):
+        fmt, pages = self.specs[self.issued % len(self.specs)]
+        # A new seed changes the text and so every content hash downstream
+        seed = self.issued if self.cold else 0
+        self.issued += 1
+        key = (fmt, pages, seed)
+        if key not in self._documents:
+            self._documents[key] = build_document(fmt, pages, seed)
+        return (
+            fmt,
+            pages,
+            self._documents.pop(key) if self.cold else self._documents[key],
+        )
+
+
+async def upload(client, fmt, pages, data):
+    response = await client.post(
+        "/upload/", files={"file": (f"rfp-{pages}p.{fmt}", data, MIME_TYPES[fmt])}
+    )
+    return response.json()["file_key"]
+
+
+async def generate(client, endpoint, fmt, pages, payload):
+    """
+    One generation request; `payload` is the document's bytes or its file key.
+    """
+    if isinstance(payload, str):
+        return await client.post(ENDPOINTS[endpoint], data={"file_key": payload})
+    return await client.post(
+        ENDPOINTS[endpoint],
+        files={"file": (f"rfp-{pages}p.{fmt}", payload, MIME_TYPES[fmt])},
+    )
+
+
+async def next_job(client, args, corpus):
+    fmt, pages, data = corpus.next()
+    if args.source == "file_key":
+        data = await upload(client, fmt, pages, data)
+    return fmt, pages, data
+
+
+async def run_level(client, args, concurrency, corpus):
+    """
+    Sends args.requests requests, `concurrency` at a time, and summarises them.
+    """
+    # Documents are built (and uploaded, for file_key) before the clock starts
+    queue = asyncio.Queue()
+    for _ in range(args.requests):
+        queue.put_nowait(await next_job(client, args, corpus))
+
+    latencies = []
+    stages = {}
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            fmt, pages, payload = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                response = await generate(client, args.endpoint, fmt, pages, payload)
+            except Exception as e:
+                print(f"Request failed: {e}")
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+            timing = response.headers.get("server-timing")
+            for name, seconds in parse_server_timing(timing or "").items():
+                stages.setdefault(name, []).append(seconds)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    return {
+        "endpoint": args.endpoint,
+        "concurrency": concurrency,
+        "requests": args.requests,
+        "errors": errors,
+        "seconds": elapsed,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "peak_rss_bytes": get_peak_rss_bytes(),
+        "stages": {
+            name: {
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "count": len(values),
+            }
+            for name, values in stages.items()
+        },
+    }
+
+
+def print_results(results):
+    print(
+        f"{'endpoint':<11} {'conc':>5} {'reqs':>5} {'errs':>5} {'rps':>7} "
+        f"{'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'peak RSS MB':>12}"
+    )
+    for result in results:
+        print(
+            f"{result['endpoint']:<11} {result['concurrency']:>5} "
+            f"{result['requests']:>5} {result['errors']:>5} {result['rps']:>7.2f} "
+            f"{result['p50']:>8.3f} {result['p95']:>8.3f} {result['p99']:>8.3f} "
+            f"{result['peak_rss_bytes'] / 1024**2:>12.0f}"
+        )
+    for result in results:
+        if not result["stages"]:
+            continue
+        print(f"\nstages at concurrency {result['concurrency']} (seconds)")
+        print(f"  {'stage':<20} {'p50':>8} {'p95':>8}")
+        for name, stage in result["stages"].items():
+            print(f"  {name:<20} {stage['p50']:>8.3f} {stage['p95']:>8.3f}")
+
+
+async def run(args, work_dir):
+    server = standins.install(work_dir, redis_url=args.redis_url)
+    await server.startup_event()
+    # The models load in the background once the server is up; wait for them
+    if server.preload_task is not None:
+        await server.preload_task
+    if not server.registry.ready:
+        print(f"Stand-in models failed to load: {server.registry.status()}")
+        return 1
+
+    corpus = Corpus(args.formats, args.pages, cold=args.cache == "cold")
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark", timeout=None
+    ) as client:
+        # Start the process pools and lazy imports before measuring; in warm mode,
+        # also fill the caches with the whole corpus
+        for _ in corpus.specs if args.cache == "warm" else [None]:
+            await generate(client, args.endpoint, *await next_job(client, args, corpus))
+
+        results = []
+        for concurrency in args.concurrency:
+            results.append(await run_level(client, args, concurrency, corpus))
+
+    await server.shutdown_event()
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(
+                {"args": vars(args), "results": results}, f, indent=2, sort_keys=True
+            )
+    return 1 if any(result["errors"] for result in results) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="proposal")
+    parser.add_argument("--formats", nargs="+", default=["pdf", "docx"])
+    parser.add_argument("--pages", type=int, nargs="+", default=[2, 10, 50])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--cache", choices=["cold", "warm"], default="cold")
+    parser.add_argument("--source", choices=["upload", "file_key"], default="upload")
+    parser.add_argument("--redis-url", help="local Redis to use instead of fakeredis")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="rfp-benchmark-")
+    try:
+        return asyncio.run(run(args, work_dir))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Cost of re-processing an amended RFP, offline.
+
+Runs app.server:app in-process against the local stand-ins (see benchmarks/standins.py),
+sends a synthetic RFP to /generate/revision/, then the same RFP re-issued with
+--amended pages changed, passing the first response's digest as previous_digest:
+
+    python -m benchmarks.revision --pages 40 --amended 7 --kind proposal
+
+Reports the time of each version, the sections the second one reports as changed, and
+how much of each kind of work it reused. The amended version should take a fraction
+of the first, roughly in proportion to the share of sections changed.
+"""
+
+import argparse
+import asyncio
+import shutil
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks import standins
+from benchmarks.load_test import MIME_TYPES, build_document
+
+
+async def submit(client, kind, fmt, data, previous_digest=None):
+    form = {"kind": kind}
+    if previous_digest:
+        form["previous_digest"] = previous_digest
+    start = time.perf_counter()
+    response = await client.post(
+        "/generate/revision/",
+        files={"file": (f"rfp.{fmt}", data, MIME_TYPES[fmt])},
+        data=form,
+    )
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    return response.json(), elapsed
+
+
+def print_reuse(name, elapsed, revision):
+    print(f"\n{name}: {elapsed:.2f}s, {len(revision['sections'])} sections")
+    if revision["changes"]:
+        print(
+            "  sections: "
+            + ", ".join(
+                f"{count} {status}" for status, count in revision["changes"].items()
+            )
+        )
+    for kind, counts in revision["reuse"].items():
+        print(
+            f"  {kind:<18} reused {counts['reused']:>4}, computed "
+            f"{counts['computed']:>4} ({counts['share_reused']:.0%} reused)"
+        )
+
+
+async def run(args, work_dir):
+    server = standins.install(work_dir, redis_url=args.redis_url)
+    await server.startup_event()
+    if server.preload_task is not None:
+        await server.preload_task
+    if not server.registry.ready:
+        print(f"Stand-in models failed to load: {server.registry.status()}")
+        return 1
+
+    original = build_document(args.format, args.pages, seed=args.seed)
+    amended = build_document(
+        args.format, args.pages, seed=args.seed, amended=tuple(args.amended)
+    )
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark", timeout=None
+    ) as client:
+        # Start the process pools on another document before measuring
+        await submit(client, args.kind, args.format, build_document(args.format, 1, -1))
+
+        first, first_seconds = await submit(client, args.kind, args.format, original)
+        print_reuse("original", first_seconds, first)
+
+        second, second_seconds = await submit(
+            client, args.kind, args.format, amended, previous_digest=first["digest"]
+        )
+        print_reuse("amended", second_seconds, second)
+
+    print(f"\namended / original time: {second_seconds / first_seconds:.2f}")
+    await server.shutdown_event()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument(
+        "--amended", type=int, nargs="+", default=[7], help="page indexes to change"
+    )
+    parser.add_argument("--format", choices=["pdf", "docx"], default="pdf")
+    parser.add_argument(
+        "--kind", choices=["proposal", "compliance"], default="proposal"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--redis-url", help="local Redis to use instead of fakeredis")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="rfp-benchmark-")
+    try:
+        return asyncio.run(run(args, work_dir))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Local stand-ins for everything the server reaches out to, so app.server:app runs offline.
+
+- Models: randomly initialised BERT and BART small enough to run anywhere, with
+  tokenizers over the synthetic corpus vocabulary, loaded through the real
+  ComplianceModel and SummarizationModel code paths.
+- Chat model: CHAT_MODEL_BACKEND=fake.
+- Embeddings and RAG LLM: llama_index's MockEmbedding and MockLLM.
+- Parser: DOCUMENT_PARSER=local, the local extraction engine instead of LlamaParse.
+- S3: moto's in-memory S3.
+- Redis: fakeredis, or a local Redis given by URL.
+
+Call install() before anything else imports the app: most settings are read from the
+environment at import time.
+"""
+
+import copy
+import json
+import os
+
+from benchmarks.corpus import vocabulary
+
+SPECIAL_BERT_TOKENS = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+
+# Small enough to load in a second and run a forward pass in milliseconds
+TINY_LAYERS = 1
+TINY_HIDDEN = 32
+TINY_HEADS = 2
+
+
+def word_variants():
+    words = vocabulary()
+    return words + [word.capitalize() for word in words]
+
+
+def write_bert(directory: str, num_labels: int):
+    from transformers import BertConfig, BertForSequenceClassification, BertTokenizer
+
+    os.makedirs(directory, exist_ok=True)
+    vocab = (
+        SPECIAL_BERT_TOKENS
+        + sorted(set(word.lower() for word in word_variants()))
+        + list("0123456789.,:;-$()")
+    )
+    vocab_file = os.path.join(directory, "vocab.txt")
+    with open(vocab_file, "w") as f:
+        f.write("\n".join(vocab) + "\n")
+
+    model = BertForSequenceClassification(
+        BertConfig(
+            vocab_size=len(vocab),
+            hidden_size=TINY_HIDDEN,
+            num_hidden_layers=TINY_LAYERS,
+            num_attention_heads=TINY_HEADS,
+            intermediate_size=TINY_HIDDEN * 2,
+            max_position_embeddings=512,
+            num_labels=num_labels,
+        )
+    )
+    model.save_pretrained(directory)
+    BertTokenizer(vocab_file).save_pretrained(directory)
+
+
+def write_bart(directory: str):
+    """
+    A byte-level BPE vocabulary with one token per corpus word (after a space), so
+    documents tokenize to about as many tokens as the real tokenizer would give.
+    """
+    from transformers import BartConfig, BartForConditionalGeneration, BartTokenizer
+    from transformers.models.bart.tokenization_bart import bytes_to_unicode
+
+    os.makedirs(directory, exist_ok=True)
+    vocab = {"<s>": 0, "<pad>": 1, "</s>": 2, "<unk>": 3}
+    for symbol in bytes_to_unicode().values():
+        vocab.setdefault(symbol, len(vocab))
+
+    merges = []
+    for word in word_variants():
+        token = "Ġ"  # the byte-level symbol for a leading space
+        for char in word:
+            merges.append(f"{token} {char}")
+            token += char
+            vocab.setdefault(token, len(vocab))
+    vocab["<mask>"] = len(vocab)
+
+    vocab_file = os.path.join(directory, "vocab.json")
+    merges_file = os.path.join(directory, "merges.txt")
+    with open(vocab_file, "w") as f:
+        json.dump(vocab, f)
+    with open(merges_file, "w") as f:
+        f.write("#version: 0.2\n" + "\n".join(dict.fromkeys(merges)) + "\n")
+
+    model = BartForConditionalGeneration(
+        BartConfig(
+            vocab_size=len(vocab),
+            d_model=TINY_HIDDEN,
+            encoder_layers=TINY_LAYERS,
+            decoder_layers=TINY_LAYERS,
+            encoder_attention_heads=TINY_HEADS,
+            decoder_attention_heads=TINY_HEADS,
+            encoder_ffn_dim=TINY_HIDDEN * 2,
+            decoder_ffn_dim=TINY_HIDDEN * 2,
+            max_position_embeddings=1024,
+            pad_token_id=1,
+            bos_token_id=0,
+            eos_token_id=2,
+            decoder_start_token_id=2,
+        )
+    )
+    model.save_pretrained(directory)
+    BartTokenizer(vocab_file, merges_file).save_pretrained(directory)
+
+
+def install(work_dir: str, redis_url: str = None):
+    """
+    Points the app at the stand-ins, with its caches under `work_dir`, and returns the
+    app.server module with the stand-in models registered. Starts from empty caches.
+    """
+    os.environ.update(
+        CHAT_MODEL_BACKEND="fake",
+        DOCUMENT_PARSER="local",
+        INDEX_CACHE_DIR=os.path.join(work_dir, "indexes"),
+        LLM_CACHE_DIR=os.path.join(work_dir, "llm_cache"),
+        DOCUMENT_CACHE_DIR=os.path.join(work_dir, "documents"),
+        AWS_ACCESS_KEY_ID="benchmark",
+        AWS_SECRET_ACCESS_KEY="benchmark",
+        AWS_DEFAULT_REGION="us-east-1",
+    )
+    if redis_url:
+        os.environ["REDIS_URL"] = redis_url
+
+    from moto import mock_aws
+
+    mock_aws().start()
+
+    from llama_index.core import Settings
+    from llama_index.core.embeddings import MockEmbedding
+    from llama_index.core.llms import MockLLM
+
+    Settings.embed_model = MockEmbedding(embed_dim=64)
+    Settings.llm = MockLLM(max_tokens=64)
+
+    import app.server as server
+    from app.services.generate_compliance.compliance_model import (
+        ComplianceModel,
+        config as compliance_config,
+        label_map,
+    )
+    from app.services.generate_proposal.summarization_model import (
+        SummarizationModel,
+        config as summarization_config,
+    )
+    from app.services.model_registry import registry
+    from core.utils.storage import S3_BUCKET, get_s3_client
+
+    get_s3_client().create_bucket(Bucket=S3_BUCKET)
+
+    bert_dir = os.path.join(work_dir, "models", "compliance")
+    bart_dir = os.path.join(work_dir, "models", "summarization")
+    write_bert(bert_dir, len(label_map))
+    write_bart(bart_dir)
+
+    # The real model classes and generation settings, on the pytorch backend
+    compliance_config = copy.deepcopy(compliance_config)
+    compliance_config["runtime"]["backend"] = "pytorch"
+    summarization_config = copy.deepcopy(summarization_config)
+    summarization_config["runtime"]["backend"] = "pytorch"
+    registry.factories = {
+        "compliance": lambda: ComplianceModel(bert_dir, compliance_config),
+        "summarization": lambda: SummarizationModel(bart_dir, summarization_config),
+    }
+
+    if not redis_url:
+        import fakeredis
+
+        async def from_url(url, **kwargs):
+            return fakeredis.FakeAsyncRedis(**kwargs)
+
+        server.aioredis.from_url = from_url
+
+    return server
@@ -0,0 +1,66 @@
+"""
+Summarisation throughput on CPU, in pages per second.
+
+Loads the summariser from the configured model path and summarises synthetic RFPs of
+increasing length in each mode:
+
+    python -m benchmarks.summarization --pages 1 10 50 --modes single map_reduce
+"""
+
+import argparse
+import copy
+import time
+
+import torch
+
+from app.services.generate_proposal.summarization_model import (
+    SummarizationModel,
+    config,
+)
+from benchmarks.corpus import synthetic_pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument(
+        "--modes",
+        nargs="+",
+        default=["single", "map_reduce"],
+        choices=["single", "map_reduce"],
+    )
+    parser.add_argument("--threads", type=int, default=torch.get_num_threads())
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+
+    model = SummarizationModel()
+    model.load()
+    model.warmup()
+
+    print(f"{'mode':<11} {'pages':>6} {'seconds':>9} {'pages/s':>9}  work")
+    for mode in args.modes:
+        model.config = copy.deepcopy(config)
+        model.config["summarization"]["mode"] = mode
+
+        for pages in args.pages:
+            content = "\n".join(synthetic_pages(pages))
+
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                if mode == "map_reduce":
+                    _, stats = model.map_reduce_summary(content)
+                    work = f"chunks per level {stats['levels']}, {stats['generate_calls']} generate calls"
+                else:
+                    model.generate_summary(content)
+                    work = "1 generate call"
+            seconds = (time.perf_counter() - start) / args.repeat
+
+            print(
+                f"{mode:<11} {pages:>6} {seconds:>9.2f} {pages / seconds:>9.2f}  {work}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from core.utils.storage import get_s3_client
+
+# Bucket holding the fine-tuned models and their serving artefacts
+MODEL_BUCKET = os.environ.get("MODEL_BUCKET", "rfp-models")
+
+# Files of one artefact downloaded at once
+ARTIFACT_DOWNLOAD_WORKERS = int(os.environ.get("ARTIFACT_DOWNLOAD_WORKERS", "8"))
+
+# Check a model directory found without a manifest against S3 before using it; off by
+# default, so models placed by hand load without S3 access
+VERIFY_ARTIFACTS = os.environ.get("VERIFY_ARTIFACTS", "0") == "1"
+
+# Checksums of an artefact's files: published next to them in S3, and written into
+# the local copy once it is complete and verified
+MANIFEST = "manifest.json"
+
+
+class ArtifactError(RuntimeError):
+    pass
+
+
+def sha256_file(path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_manifest(local_dir: str) -> dict:
+    """
+    Size and SHA-256 of every file under `local_dir`, keyed by relative path.
+    """
+    files = {}
+    for root, _, names in os.walk(local_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            relpath = os.path.relpath(path, local_dir)
+            if relpath == MANIFEST:
+                continue
+            files[relpath] = {
+                "size": os.path.getsize(path),
+                "sha256": sha256_file(path),
+            }
+    return {"files": files}
+
+
+def write_manifest(local_dir: str) -> dict:
+    manifest = build_manifest(local_dir)
+    with open(os.path.join(local_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def is_complete(local_path: str) -> bool:
+    """
+    Whether `local_path` holds a fully downloaded and verified artefact.
+    """
+    return os.path.isfile(os.path.join(local_path, MANIFEST))
+
+
+def list_artifact(bucket: str, prefix: str) -> dict:
+    """
+    Sizes of the objects under `prefix`, keyed by path relative to it, over every page;
+    empty if the bucket does not exist.
+    """
+    objects = {}
+    paginator = get_s3_client().get_paginator("list_objects_v2")
+    try:
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                relpath = os.path.relpath(obj["Key"], prefix)
+                if not obj["Key"].endswith("/"):
+                    objects[relpath] = obj["Size"]
+    except get_s3_client().exceptions.NoSuchBucket:
+        # Nothing published, e.g. in development with models placed by hand
+        return {}
+    return objects
+
+
+def is_unreachable(error: Exception) -> bool:
+    """
+    Whether `error` means S3 could not be asked at all: no credentials, no connection
+    to the endpoint, or access denied.
+    """
+    from botocore.exceptions import (
+        ClientError,
+        EndpointConnectionError,
+        NoCredentialsError,
+    )
+
+    if isinstance(error, (NoCredentialsError, EndpointConnectionError)):
+        return True
+    return (
+        isinstance(error, ClientError)
+        and error.response["Error"]["Code"] == "AccessDenied"
+    )
+
+
+def read_remote_manifest(bucket: str, prefix: str):
+    try:
+        response = get_s3_client().get_object(Bucket=bucket, Key=f"{prefix}{MANIFEST}")
+    except get_s3_client().exceptions.NoSuchKey:
+        return None
+    return json.loads(response["Body"].read())
+
+
+def download_object(bucket, key, path, size, sha256=None, chunk_size=1024 * 1024):
+    """
+    Downloads one object to `path`, resuming from where a previous attempt stopped.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    offset = os.path.getsize(path) if os.path.exists(path) else 0
+    if offset > size:
+        offset = 0
+
+    if offset < size:
+        response = get_s3_client().get_object(
+            Bucket=bucket, Key=key, Range=f"bytes={offset}-"
+        )
+        with open(path, "ab" if offset else "wb") as f:
+            for chunk in response["Body"].iter_chunks(chunk_size):
+                f.write(chunk)
+    elif not os.path.exists(path):
+        # Empty object (e.g. a placeholder file)
+        open(path, "wb").close()
+
+    if os.path.getsize(path) != size:
+        raise ArtifactError(
+            f"{key}: expected {size} bytes, got {os.path.getsize(path)}"
+        )
+    if sha256 is not None and sha256_file(path) != sha256:
+        # Corrupt, or left over from an older version of the object
+        os.remove(path)
+        raise ArtifactError(f"{key}: checksum mismatch")
+
+
+def matches_remote(local_path: str, objects: dict, checksums: dict) -> bool:
+    """
+    Whether `local_path` holds every remote file with the right size, and the right
+    SHA-256 where the remote manifest publishes one.
+    """
+    for relpath, size in objects.items():
+        path = os.path.join(local_path, relpath)
+        if not os.path.isfile(path) or os.path.getsize(path) != size:
+            return False
+        sha256 = checksums.get(relpath)
+        if sha256 is not None and sha256_file(path) != sha256:
+            return False
+    return True
+
+
+def fetch_artifact(
+    prefix: str, local_path: str, bucket: str = MODEL_BUCKET, verify: bool = None
+):
+    """
+    Downloads the artefact directory `prefix` from S3 to `local_path` unless a complete
+    copy is already there. A directory without a local manifest is used as it is,
+    unless `verify` (default VERIFY_ARTIFACTS) asks for it to be checked against the
+    remote files first; it is then only kept if it matches them, or if S3 cannot be
+    reached.
+
+    Files are listed over every page and downloaded in parallel into a staging
+    directory next to `local_path`, which is kept between attempts so an interrupted
+    download resumes where it stopped. Each file is checked against the published
+    manifest.json when there is one (otherwise by size), then the staging directory is
+    swapped into place in one rename. Raises ArtifactError if anything is missing.
+    """
+    if is_complete(local_path):
+        return local_path
+    if verify is None:
+        verify = VERIFY_ARTIFACTS
+    if os.path.isdir(local_path) and not verify:
+        print(f"Using unverified {local_path}: set VERIFY_ARTIFACTS=1 to check it")
+        return local_path
+
+    prefix = prefix.rstrip("/") + "/"
+    try:
+        objects = list_artifact(bucket, prefix)
+    except Exception as e:
+        if not (os.path.isdir(local_path) and is_unreachable(e)):
+            raise
+        print(f"Using unverified {local_path}: cannot list {prefix} in {bucket}: {e}")
+        return local_path
+    if not objects:
+        if os.path.isdir(local_path):
+            # Placed by hand, with nothing in S3 to check it against
+            print(f"Using unverified {local_path}: no files for {prefix} in {bucket}")
+            return local_path
+        raise ArtifactError(f"No files found for {prefix} in bucket {bucket}")
+
+    remote_manifest = read_remote_manifest(bucket, prefix) or {"files": {}}
+    checksums = {
+        relpath: entry.get("sha256")
+        for relpath, entry in remote_manifest["files"].items()
+    }
+    objects.pop(MANIFEST, None)
+
+    if os.path.isdir(local_path):
+        # Written by an older release straight into place, before manifests existed;
+        # a download it was interrupted in left a partial copy
+        if matches_remote(local_path, objects, checksums):
+            write_manifest(local_path)
+            return local_path
+        print(f"{local_path} does not match s3://{bucket}/{prefix}; fetching it again")
+
+    staging_dir = local_path.rstrip("/") + ".partial"
+    print(f"Downloading {len(objects)} files from s3://{bucket}/{prefix}")
+
+    def download(relpath):
+        download_object(
+            bucket,
+            prefix + relpath,
+            os.path.join(staging_dir, relpath),
+            objects[relpath],
+            checksums.get(relpath),
+        )
+
+    with ThreadPoolExecutor(max_workers=ARTIFACT_DOWNLOAD_WORKERS) as pool:
+        futures = {relpath: pool.submit(download, relpath) for relpath in objects}
+    errors = [
+        f"{relpath}: {future.exception()}"
+        for relpath, future in futures.items()
+        if future.exception() is not None
+    ]
+    if errors:
+        raise ArtifactError(f"Downloading {prefix} failed: {'; '.join(errors)}")
+
+    write_manifest(staging_dir)
+    # Readers only ever see no directory or a complete one
+    shutil.rmtree(local_path, ignore_errors=True)
+    os.rename(staging_dir, local_path)
+    print(f"Downloaded s3://{bucket}/{prefix} to {local_path}")
+    return local_path
@@ -0,0 +1,254 @@
+import asyncio
+import json
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+
+from core.utils.metrics import count_cache, time_stage
+from core.utils.singleflight import SingleFlight
+
+# Compare-and-delete so a worker only ever releases the lock it still owns
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class ResultCache:
+    """
+    Two-tier cache for generated results: a small in-process LRU in front of Redis.
+
+    Values are JSON-serialisable results, stored in Redis as zlib-compressed JSON.
+    get_or_compute() de-duplicates concurrent misses on the same key, both within the
+    process (SingleFlight) and across pods (a short-lived Redis lock), so N
+    concurrent uploads of the same RFP trigger exactly one pipeline run.
+    """
+
+    def __init__(
+        self,
+        redis=None,
+        name: str = "result",
+        max_local_entries: int = 128,
+        ttl: int = 3600,
+        lock_timeout: float = 600.0,
+        poll_interval: float = 0.25,
+    ):
+        self.redis = redis
+        # Label of this cache's lookups in the metrics
+        self.name = name
+        self.max_local_entries = max_local_entries
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._local = OrderedDict()
+        self._inflight = SingleFlight()
+
+    @staticmethod
+    def make_key(kind: str, version: str, digest: str) -> str:
+        """
+        Cache key for a result of `kind` computed by pipeline `version` over content `digest`.
+        """
+        return f"result:{kind}:{version}:{digest}"
+
+    @staticmethod
+    def encode(value) -> bytes:
+        return zlib.compress(json.dumps(value).encode("utf-8"))
+
+    @staticmethod
+    def decode(payload: bytes):
+        return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+    def _get_local(self, key):
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return value
+
+    def _set_local(self, key, value, ttl):
+        self._local[key] = (value, time.monotonic() + ttl)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_local_entries:
+            self._local.popitem(last=False)
+
+    async def get(self, key):
+        value = self._get_local(key)
+        if value is not None:
+            count_cache(self.name, "hit_local")
+            return value
+        if self.redis is None:
+            count_cache(self.name, "miss")
+            return None
+
+        try:
+            with time_stage("redis"):
+                payload = await self.redis.get(key)
+        except Exception as e:
+            print(f"Error reading {key} from Redis: {e}")
+            return None
+        if payload is None:
+            count_cache(self.name, "miss")
+            return None
+
+        count_cache(self.name, "hit_redis")
+        value = self.decode(payload)
+        ttl = await self._remaining_ttl(key)
+        self._set_local(key, value, ttl)
+        return value
+
+    async def set(self, key, value, ttl: int = None):
+        ttl = ttl or self.ttl
+        self._set_local(key, value, ttl)
+        if self.redis is None:
+            return
+        try:
+            with time_stage("redis"):
+                await self.redis.set(key, self.encode(value), ex=ttl)
+        except Exception as e:
+            print(f"Error writing {key} to Redis: {e}")
+
+    async def get_many(self, keys: list) -> dict:
+        """
+        Looks up several keys at once: the local tier first, then the rest (with their
+        remaining TTLs) in one pipelined round trip to Redis.
+
+        Returns the values found, by key.
+        """
+        values = {}
+        remote = []
+        for key in dict.fromkeys(keys):
+            value = self._get_local(key)
+            if value is not None:
+                count_cache(self.name, "hit_local")
+                values[key] = value
+            else:
+                remote.append(key)
+        if not remote or self.redis is None:
+            for _ in remote:
+                count_cache(self.name, "miss")
+            return values
+
+        pipe = self.redis.pipeline(transaction=False)
+        for key in remote:
+            pipe.get(key)
+            pipe.ttl(key)
+        try:
+            with time_stage("redis"):
+                replies = await pipe.execute()
+        except Exception as e:
+            print(f"Error reading {len(remote)} keys from Redis: {e}")
+            return values
+
+        for key, payload, ttl in zip(remote, replies[::2], replies[1::2]):
+            if payload is None:
+                count_cache(self.name, "miss")
+                continue
+            count_cache(self.name, "hit_redis")
+            values[key] = self.decode(payload)
+            self._set_local(key, values[key], ttl if ttl and ttl > 0 else self.ttl)
+        return values
+
+    async def set_many(self, items: dict, ttl: int = None):
+        """
+        Stores several values, sending all the Redis writes in one pipelined round trip.
+        """
+        ttl = ttl or self.ttl
+        for key, value in items.items():
+            self._set_local(key, value, ttl)
+        if self.redis is None or not items:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        for key, value in items.items():
+            pipe.set(key, self.encode(value), ex=ttl)
+        try:
+            with time_stage("redis"):
+                await pipe.execute()
+        except Exception as e:
+            print(f"Error writing {len(items)} keys to Redis: {e}")
+
+    async def _remaining_ttl(self, key):
+        try:
+            ttl = await self.redis.ttl(key)
+        except Exception:
+            ttl = -1
+        # Keys without an expiry still age out of the local tier
+        return ttl if ttl and ttl > 0 else self.ttl
+
+    async def get_or_compute(self, key, compute, ttl: int = None):
+        """
+        Returns the cached value for `key`, awaiting `compute()` exactly once on a miss.
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+        return await self._inflight.do(
+            key, lambda: self._compute_locked(key, compute, ttl)
+        )
+
+    async def _compute_locked(self, key, compute, ttl):
+        if self.redis is None:
+            value = await compute()
+            await self.set(key, value, ttl)
+            return value
+
+        lock_key = f"{key}:lock"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_timeout
+
+        while True:
+            try:
+                acquired = await self.redis.set(
+                    lock_key, token, nx=True, px=int(self.lock_timeout * 1000)
+                )
+            except Exception as e:
+                print(f"Error acquiring {lock_key}: {e}")
+                acquired = True
+                token = None
+
+            if acquired:
+                try:
+                    value = await compute()
+                    await self.set(key, value, ttl)
+                    return value
+                finally:
+                    if token is not None:
+                        await self._release(lock_key, token)
+
+            # Another pod is computing the same result; wait for it to land
+            await asyncio.sleep(self.poll_interval)
+            value = await self._poll(key)
+            if value is not None:
+                return value
+            if time.monotonic() > deadline:
+                value = await compute()
+                await self.set(key, value, ttl)
+                return value
+
+    async def _poll(self, key):
+        """
+        The value another pod stored for `key`, or None; unlike get(), not counted in
+        the hit and miss metrics.
+        """
+        try:
+            payload = await self.redis.get(key)
+        except Exception as e:
+            print(f"Error reading {key} from Redis: {e}")
+            return None
+        if payload is None:
+            return None
+        value = self.decode(payload)
+        self._set_local(key, value, await self._remaining_ttl(key))
+        return value
+
+    async def _release(self, lock_key, token):
+        try:
+            await self.redis.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+        except Exception as e:
+            print(f"Error releasing {lock_key}: {e}")
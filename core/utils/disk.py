@@ -0,0 +1,83 @@
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+
+# Marks the private files and directories entries are built in; listings skip them
+TMP_MARKER = ".tmp-"
+
+
+def temp_path(path: str) -> str:
+    """
+    A private path next to `path` to build it in before moving it into place.
+    """
+    return f"{path}{TMP_MARKER}{uuid.uuid4().hex}"
+
+
+def is_temp(name: str) -> bool:
+    return TMP_MARKER in name
+
+
+def discard(path: str):
+    """
+    Removes the file or directory at `path`, if there is one.
+    """
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@contextmanager
+def atomic_path(path: str):
+    """
+    Yields a temp_path() to write the file or directory `path` in, then renames it into
+    place once the block completes, so readers only ever see nothing (or the previous
+    file) or the finished entry. The temporary copy is removed either way.
+
+    A directory is not renamed over an existing one: OSError is raised and the existing
+    one kept, e.g. when another process built the same entry first.
+    """
+    tmp_path = temp_path(path)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        discard(tmp_path)
+
+
+def write_atomic(path: str, data: bytes):
+    """
+    Writes `data` to `path` through atomic_path, creating its directory. Raises OSError.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_path(path) as tmp_path:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+
+
+def entry_size(path: str) -> int:
+    """
+    Size of a file, or of the files directly in a directory.
+    """
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def evict_lru(entries, max_bytes: int) -> int:
+    """
+    Removes the least recently used of `entries`, (path, mtime, size) of files or
+    directories whose mtime is refreshed on use, until their total size is at most
+    `max_bytes`. Returns the total size left.
+    """
+    size = sum(entry_size for _, _, entry_size in entries)
+    for path, _, entry_size in sorted(entries, key=lambda entry: entry[1]):
+        if size <= max_bytes:
+            break
+        discard(path)
+        size -= entry_size
+    return size
@@ -0,0 +1,143 @@
+import hashlib
+import os
+import shutil
+
+from core.utils.disk import atomic_path, entry_size, evict_lru, is_temp, write_atomic
+from core.utils.executors import run_io
+from core.utils.metrics import count_cache, time_stage
+from core.utils.singleflight import SingleFlight
+from core.utils.storage import download_file_from_s3_to_path
+
+# S3 documents and their extracted text are kept on local disk here
+DOCUMENT_CACHE_DIR = os.environ.get("DOCUMENT_CACHE_DIR", "data/documents")
+
+# The least recently used documents and texts are dropped beyond this size
+DOCUMENT_CACHE_MAX_BYTES = int(
+    os.environ.get("DOCUMENT_CACHE_MAX_BYTES", str(2 * 1024**3))
+)
+
+
+class DocumentCache:
+    """
+    Size-bounded LRU on local disk of S3 documents, by file key, and of extracted text,
+    by document content hash.
+
+    Each document is a directory holding the file and its SHA-256. Callers get a hard
+    link (or a copy across filesystems) in their own directory, so an entry evicted
+    mid-request does not pull the file from under them.
+    """
+
+    def __init__(
+        self,
+        directory: str = DOCUMENT_CACHE_DIR,
+        max_bytes: int = DOCUMENT_CACHE_MAX_BYTES,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._inflight = SingleFlight()
+
+    def _document_dir(self, file_key):
+        name = hashlib.sha256(file_key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, "documents", name)
+
+    def _text_path(self, digest, version):
+        return os.path.join(self.directory, "texts", f"{digest}-{version}.txt")
+
+    async def fetch(self, file_key: str, dest_dir: str):
+        """
+        Places the S3 object `file_key` in `dest_dir`, downloading it only on a miss.
+
+        Returns the local path and the SHA-256 of the content.
+        """
+        document_dir = self._document_dir(file_key)
+        filename = os.path.basename(file_key)
+
+        if await run_io(os.path.isdir, document_dir):
+            count_cache("document", "hit_disk")
+        else:
+            count_cache("document", "miss")
+            await self._inflight.do(
+                document_dir, lambda: self._download(file_key, document_dir)
+            )
+
+        def stage():
+            dest = os.path.join(dest_dir, filename)
+            source = os.path.join(document_dir, filename)
+            try:
+                os.link(source, dest)
+            except OSError:
+                shutil.copyfile(source, dest)
+            with open(os.path.join(document_dir, "sha256")) as f:
+                digest = f.read()
+            # Mark the entry as recently used
+            os.utime(document_dir)
+            return dest, digest
+
+        try:
+            return await run_io(stage)
+        except FileNotFoundError:
+            # Evicted between the check and the link; fetch it again
+            await run_io(shutil.rmtree, document_dir, True)
+            return await self.fetch(file_key, dest_dir)
+
+    async def _download(self, file_key, document_dir):
+        try:
+            with atomic_path(document_dir) as build_dir:
+                os.makedirs(build_dir)
+                with time_stage("s3_download"):
+                    digest = await download_file_from_s3_to_path(
+                        file_key, os.path.join(build_dir, os.path.basename(file_key))
+                    )
+
+                def write_digest():
+                    with open(os.path.join(build_dir, "sha256"), "w") as f:
+                        f.write(digest)
+
+                await run_io(write_digest)
+        except OSError:
+            if not await run_io(os.path.isdir, document_dir):
+                raise
+            # Another process cached the same document first
+        await run_io(self.evict)
+
+    def get_text(self, digest: str, version: str):
+        path = self._text_path(digest, version)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return text
+
+    def set_text(self, digest: str, version: str, text: str, evict: bool = True):
+        path = self._text_path(digest, version)
+        try:
+            write_atomic(path, text.encode("utf-8"))
+        except OSError as e:
+            print(f"Error caching extracted text {path}: {e}")
+            return
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """
+        Drops the least recently used documents and texts down to max_bytes.
+        """
+        entries = []
+        for kind in ("documents", "texts"):
+            root = os.path.join(self.directory, kind)
+            if not os.path.isdir(root):
+                continue
+            for name in os.listdir(root):
+                if is_temp(name):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    entries.append((path, os.stat(path).st_mtime, entry_size(path)))
+                except FileNotFoundError:
+                    pass
+        evict_lru(entries, self.max_bytes)
+
+
+document_cache = DocumentCache()
@@ -0,0 +1,72 @@
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Each stage gets its own bounded pool so its concurrency can be tuned independently;
+# the sizes are part of the serving layout
+from core.utils.serving import INFERENCE_WORKERS, IO_WORKERS, PARSE_WORKERS
+
+_pools = {}
+
+
+def get_pool(name: str):
+    """
+    Returns the named pool ("inference", "parse" or "io"), creating it on first use.
+    """
+    pool = _pools.get(name)
+    if pool is not None:
+        return pool
+
+    if name == "inference":
+        pool = ThreadPoolExecutor(
+            max_workers=INFERENCE_WORKERS, thread_name_prefix="inference"
+        )
+    elif name == "parse":
+        # forkserver children start from a clean process instead of forking a
+        # multi-threaded server that may hold locks or torch thread pools
+        pool = ProcessPoolExecutor(
+            max_workers=PARSE_WORKERS,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+    elif name == "io":
+        pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+    else:
+        raise ValueError(f"Unknown executor pool: {name}")
+
+    _pools[name] = pool
+    return pool
+
+
+async def run_in_pool(name: str, fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_pool(name), functools.partial(fn, *args, **kwargs)
+    )
+
+
+async def run_inference(fn, *args, **kwargs):
+    """
+    Runs a model forward pass / generate call off the event loop.
+    """
+    return await run_in_pool("inference", fn, *args, **kwargs)
+
+
+async def run_parse(fn, *args, **kwargs):
+    """
+    Runs CPU-bound document parsing in a worker process; `fn` and its arguments must pickle.
+    """
+    return await run_in_pool("parse", fn, *args, **kwargs)
+
+
+async def run_io(fn, *args, **kwargs):
+    """
+    Runs a blocking network or disk call (S3, OpenAI, query engine) off the event loop.
+    """
+    return await run_in_pool("io", fn, *args, **kwargs)
+
+
+def shutdown():
+    for pool in _pools.values():
+        pool.shutdown(wait=False, cancel_futures=True)
+    _pools.clear()
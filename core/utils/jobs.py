@@ -0,0 +1,210 @@
+import json
+import os
+import time
+import uuid
+
+from core.utils.cache import ResultCache
+
+QUEUE_KEY = "jobs:queue"
+PROCESSING_KEY = "jobs:processing"
+
+# Attempts per job before it is marked failed (read here, so the web pods that submit
+# jobs and the workers that run them agree)
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+
+# Jobs and their results are kept this long (seconds)
+JOB_TTL = int(os.environ.get("JOB_TTL", "86400"))
+
+# Fails one attempt of a job that has been running too long, in one step so that two
+# workers sweeping at once cannot both re-queue it. KEYS: the job, jobs:processing,
+# jobs:queue; ARGV: job id, now, visibility timeout, max attempts, error. Returns the
+# job's new status, or nil if it was left alone.
+REQUEUE_STALE_SCRIPT = """
+local job = redis.call("hmget", KEYS[1], "status", "started_at", "attempts")
+if not job[1] then
+    redis.call("lrem", KEYS[2], 0, ARGV[1])
+    return false
+end
+if job[1] ~= "running" or not job[2] then
+    return false
+end
+if tonumber(ARGV[2]) - tonumber(job[2]) <= tonumber(ARGV[3]) then
+    return false
+end
+local status = "failed"
+if tonumber(job[3]) < tonumber(ARGV[4]) then
+    status = "queued"
+end
+redis.call("hset", KEYS[1], "status", status, "error", ARGV[5], "updated_at", ARGV[2])
+if status == "failed" then
+    redis.call("hset", KEYS[1], "finished_at", ARGV[2])
+end
+redis.call("lrem", KEYS[2], 0, ARGV[1])
+if status == "queued" then
+    redis.call("lpush", KEYS[3], ARGV[1])
+end
+return status
+"""
+
+
+class JobQueue:
+    """
+    Redis-backed queue of generation jobs shared by the web pods and the inference workers.
+
+    Each job is a hash at jobs:<id> (status, kind, payload, attempts, error, timestamps)
+    and its id is pushed on jobs:queue. Workers move ids atomically onto jobs:processing
+    while they run them, so jobs held by a crashed worker can be re-queued. Results are
+    stored compressed at jobs:<id>:result. Everything expires after `ttl` seconds.
+    """
+
+    def __init__(self, redis, ttl: int = JOB_TTL, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.redis = redis
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+
+    @staticmethod
+    def _job_key(job_id: str) -> str:
+        return f"jobs:{job_id}"
+
+    @staticmethod
+    def _result_key(job_id: str) -> str:
+        return f"jobs:{job_id}:result"
+
+    @staticmethod
+    def upload_prefix(job_id: str) -> str:
+        """
+        S3 prefix of the document uploaded for a job, deleted once it is finished.
+        """
+        return f"jobs/{job_id}"
+
+    async def submit(self, kind: str, payload: dict, job_id: str = None) -> str:
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        job_key = self._job_key(job_id)
+
+        pipe = self.redis.pipeline()
+        pipe.hset(
+            job_key,
+            mapping={
+                "id": job_id,
+                "kind": kind,
+                "payload": json.dumps(payload),
+                "status": "queued",
+                "attempts": 0,
+                "error": "",
+                "created_at": now,
+                "updated_at": now,
+            },
+        )
+        pipe.expire(job_key, self.ttl)
+        pipe.lpush(QUEUE_KEY, job_id)
+        await pipe.execute()
+
+        return job_id
+
+    async def status(self, job_id: str):
+        fields = await self.redis.hgetall(self._job_key(job_id))
+        if not fields:
+            return None
+
+        job = {key.decode(): value.decode() for key, value in fields.items()}
+        job["payload"] = json.loads(job["payload"])
+        job["attempts"] = int(job["attempts"])
+        for key in ("created_at", "updated_at", "started_at", "finished_at"):
+            if key in job:
+                job[key] = float(job[key])
+        return job
+
+    async def result(self, job_id: str):
+        payload = await self.redis.get(self._result_key(job_id))
+        if payload is None:
+            return None
+        return ResultCache.decode(payload)
+
+    async def claim(self, timeout: int = 5):
+        """
+        Blocks up to `timeout` seconds for the next job and marks it running.
+        """
+        job_id = await self.redis.brpoplpush(QUEUE_KEY, PROCESSING_KEY, timeout)
+        if job_id is None:
+            return None
+        job_id = job_id.decode()
+
+        job_key = self._job_key(job_id)
+        now = time.time()
+        pipe = self.redis.pipeline()
+        pipe.hset(
+            job_key, mapping={"status": "running", "started_at": now, "updated_at": now}
+        )
+        pipe.hincrby(job_key, "attempts", 1)
+        await pipe.execute()
+
+        job = await self.status(job_id)
+        if job is None:
+            # The job expired while it was queued
+            await self.redis.lrem(PROCESSING_KEY, 0, job_id)
+        return job
+
+    async def complete(self, job_id: str, result):
+        now = time.time()
+        pipe = self.redis.pipeline()
+        pipe.set(self._result_key(job_id), ResultCache.encode(result), ex=self.ttl)
+        pipe.hset(
+            self._job_key(job_id),
+            mapping={"status": "succeeded", "finished_at": now, "updated_at": now},
+        )
+        pipe.lrem(PROCESSING_KEY, 0, job_id)
+        await pipe.execute()
+
+    async def fail(self, job_id: str, error: str):
+        """
+        Records a failed attempt, re-queueing the job until it runs out of attempts.
+        """
+        job = await self.status(job_id)
+        retry = job is not None and job["attempts"] < self.max_attempts
+        now = time.time()
+
+        pipe = self.redis.pipeline()
+        pipe.hset(
+            self._job_key(job_id),
+            mapping={
+                "status": "queued" if retry else "failed",
+                "error": error,
+                "updated_at": now,
+                **({} if retry else {"finished_at": now}),
+            },
+        )
+        pipe.lrem(PROCESSING_KEY, 0, job_id)
+        if retry:
+            pipe.lpush(QUEUE_KEY, job_id)
+        await pipe.execute()
+
+        return retry
+
+    async def requeue_stale(self, visibility_timeout: float):
+        """
+        Puts back jobs that have been running for longer than `visibility_timeout` seconds,
+        e.g. because the worker holding them was killed. Jobs just claimed, whose start
+        is not recorded yet, are left alone.
+
+        Returns the new status ("queued", or "failed" once out of attempts) of each job
+        it put back, by id.
+        """
+        stale = {}
+        for job_id in await self.redis.lrange(PROCESSING_KEY, 0, -1):
+            job_id = job_id.decode()
+            status = await self.redis.eval(
+                REQUEUE_STALE_SCRIPT,
+                3,
+                self._job_key(job_id),
+                PROCESSING_KEY,
+                QUEUE_KEY,
+                job_id,
+                time.time(),
+                visibility_timeout,
+                self.max_attempts,
+                "Job timed out or its worker stopped.",
+            )
+            if status is not None:
+                stale[job_id] = status.decode()
+        return stale
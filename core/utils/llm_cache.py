@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import zlib
+
+from core.utils.disk import discard, evict_lru, is_temp, write_atomic
+from core.utils.executors import run_io
+from core.utils.metrics import count_cache, time_stage
+from core.utils.singleflight import SingleFlight
+
+# Memoised LLM and RAG answers are kept on local disk here, in front of Redis
+LLM_CACHE_DIR = os.environ.get("LLM_CACHE_DIR", "data/llm_cache")
+
+# Answers expire after this long (seconds) in both tiers
+LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+
+# The disk tier drops its least recently used answers beyond this size
+LLM_CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", str(256 * 1024**2)))
+
+
+def normalise_input(text: str) -> str:
+    """
+    Collapses whitespace so trivially reformatted inputs share a cache entry.
+    """
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class DiskTier:
+    """
+    Size-bounded directory of zlib-compressed JSON entries, one file per key.
+
+    Reads refresh a file's mtime, so eviction drops the least recently used entries
+    first once the directory grows past `max_bytes`. Methods run on the I/O pool's
+    threads; the running size total is updated under a lock.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None
+        self._size_lock = threading.RLock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = json.loads(zlib.decompress(f.read()).decode("utf-8"))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, zlib.error) as e:
+            print(f"Error reading cache entry {path}: {e}")
+            return None
+
+        if entry["expires_at"] < time.time():
+            discard(path)
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def set(self, key, entry):
+        path = self._path(key)
+        payload = zlib.compress(json.dumps(entry).encode("utf-8"))
+        try:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            write_atomic(path, payload)
+        except OSError as e:
+            print(f"Error writing cache entry {path}: {e}")
+            return
+
+        with self._size_lock:
+            self._size = self.size() + len(payload) - previous
+            if self._size > self.max_bytes:
+                self.evict()
+
+    def size(self):
+        with self._size_lock:
+            if self._size is None:
+                self._size = sum(size for _, _, size in self._entries())
+            return self._size
+
+    def evict(self):
+        """
+        Removes the least recently used entries down to 90% of max_bytes.
+        """
+        with self._size_lock:
+            self._size = evict_lru(self._entries(), int(self.max_bytes * 0.9))
+
+    def _entries(self):
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if is_temp(name):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat.st_mtime, stat.st_size))
+        return entries
+
+
+class CallCache:
+    """
+    Memoises model calls (chat completions, RAG queries) on a local disk tier in front of Redis.
+
+    Keys cover everything that changes the answer: the call kind, model name,
+    temperature, prompt template version and a hash of the normalised input. Concurrent
+    misses on the same key within the process share one call. Hit and miss counts,
+    and the model time saved by hits, are reported by stats().
+    """
+
+    def __init__(
+        self,
+        redis=None,
+        directory: str = LLM_CACHE_DIR,
+        ttl: int = LLM_CACHE_TTL,
+        max_bytes: int = LLM_CACHE_MAX_BYTES,
+    ):
+        self.redis = redis
+        self.ttl = ttl
+        self.disk = DiskTier(directory, max_bytes)
+        self._inflight = SingleFlight()
+        self._stats = {}
+
+    @staticmethod
+    def make_key(
+        kind: str, model: str, temperature, prompt_version: str, text: str
+    ) -> str:
+        digest = hashlib.sha256(normalise_input(text).encode("utf-8")).hexdigest()
+        parts = json.dumps([kind, model, temperature, prompt_version, digest])
+        return hashlib.sha256(parts.encode("utf-8")).hexdigest()
+
+    def _count(self, kind, field, amount=1):
+        counters = self._stats.setdefault(
+            kind,
+            {"disk_hits": 0, "redis_hits": 0, "misses": 0, "saved_seconds": 0.0},
+        )
+        counters[field] += amount
+
+    def count_miss(self, kind: str):
+        """
+        Counts a miss for a call made without get_or_call, e.g. a streamed one.
+        """
+        self._count(kind, "misses")
+
+    async def get(self, kind: str, key: str):
+        entry = await run_io(self.disk.get, key)
+        if entry is not None:
+            count_cache(f"llm_{kind}", "hit_disk")
+            self._count(kind, "disk_hits")
+            self._count(kind, "saved_seconds", entry["seconds"])
+            return entry["value"]
+
+        if self.redis is None:
+            count_cache(f"llm_{kind}", "miss")
+            return None
+        try:
+            with time_stage("redis"):
+                payload = await self.redis.get(f"llm:{key}")
+        except Exception as e:
+            print(f"Error reading llm:{key} from Redis: {e}")
+            return None
+        if payload is None:
+            count_cache(f"llm_{kind}", "miss")
+            return None
+
+        entry = json.loads(zlib.decompress(payload).decode("utf-8"))
+        count_cache(f"llm_{kind}", "hit_redis")
+        self._count(kind, "redis_hits")
+        self._count(kind, "saved_seconds", entry["seconds"])
+        # Promote to the disk tier so the next hit on this node skips the network
+        await run_io(self.disk.set, key, entry)
+        return entry["value"]
+
+    async def set(self, key: str, value, seconds: float = 0.0):
+        entry = {
+            "value": value,
+            "seconds": seconds,
+            "expires_at": time.time() + self.ttl,
+        }
+        await run_io(self.disk.set, key, entry)
+        if self.redis is None:
+            return
+        try:
+            with time_stage("redis"):
+                await self.redis.set(
+                    f"llm:{key}",
+                    zlib.compress(json.dumps(entry).encode("utf-8")),
+                    ex=self.ttl,
+                )
+        except Exception as e:
+            print(f"Error writing llm:{key} to Redis: {e}")
+
+    async def get_or_call(self, kind: str, key: str, call):
+        """
+        Returns the memoised answer for `key`, awaiting `call()` on a miss.
+
+        Exceptions from `call()` propagate and nothing is stored.
+        """
+        value = await self.get(kind, key)
+        if value is not None:
+            return value
+
+        async def call_and_store():
+            self._count(kind, "misses")
+            started = time.perf_counter()
+            value = await call()
+            await self.set(key, value, time.perf_counter() - started)
+            return value
+
+        return await self._inflight.do(key, call_and_store)
+
+    def stats(self):
+        kinds = {}
+        for kind, counters in self._stats.items():
+            hits = counters["disk_hits"] + counters["redis_hits"]
+            lookups = hits + counters["misses"]
+            kinds[kind] = dict(
+                counters,
+                saved_seconds=round(counters["saved_seconds"], 3),
+                hit_rate=round(hits / lookups, 4) if lookups else None,
+            )
+        return {
+            "kinds": kinds,
+            "disk_bytes": self.disk._size,
+            "disk_max_bytes": self.disk.max_bytes,
+            "ttl": self.ttl,
+        }
+
+
+# Shared by the chat and RAG call sites (Redis bound at startup)
+llm_cache = CallCache()
@@ -0,0 +1,155 @@
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Prometheus metrics for the request path, served on /metrics.
+#
+# With several web workers (see main.py), set PROMETHEUS_MULTIPROC_DIR to an empty
+# directory: every worker then writes its samples there and /metrics reports the sum
+# over all of them, whichever worker answers the scrape.
+PROMETHEUS_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+# Seconds; the pipeline stages range from cache hits to multi-minute generations
+STAGE_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+    300,
+)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+REQUEST_SECONDS = Histogram(
+    "rfp_request_seconds",
+    "Latency of the generate handlers.",
+    ["endpoint", "status"],
+    buckets=STAGE_BUCKETS,
+)
+
+REQUESTS_IN_PROGRESS = Gauge(
+    "rfp_requests_in_progress",
+    "Generate requests being handled.",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+
+STAGE_SECONDS = Histogram(
+    "rfp_stage_seconds",
+    "Latency of one pipeline stage: extraction, cleaning, parsing, embedding, "
+    "model inference, chat completions and Redis calls.",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+
+CACHE_LOOKUPS = Counter(
+    "rfp_cache_lookups_total",
+    "Cache lookups by cache, tier that answered (or miss).",
+    ["cache", "result"],
+)
+
+INFERENCE_BATCH_SIZE = Histogram(
+    "rfp_inference_batch_size",
+    "Inputs per model forward pass or generate call.",
+    ["model"],
+    buckets=BATCH_SIZE_BUCKETS,
+)
+
+TOKENS = Counter(
+    "rfp_tokens_total",
+    "Tokens read (input) and produced (output) per model.",
+    ["model", "direction"],
+)
+
+
+def time_stage(stage: str):
+    """
+    Context manager (or decorator) recording the duration of `stage`, failures included.
+    """
+    return STAGE_SECONDS.labels(stage=stage).time()
+
+
+def count_cache(cache: str, result: str):
+    CACHE_LOOKUPS.labels(cache=cache, result=result).inc()
+
+
+def observe_batch(model: str, size: int):
+    INFERENCE_BATCH_SIZE.labels(model=model).observe(size)
+
+
+def count_tokens(model: str, input_tokens: int = 0, output_tokens: int = 0):
+    if input_tokens:
+        TOKENS.labels(model=model, direction="input").inc(input_tokens)
+    if output_tokens:
+        TOKENS.labels(model=model, direction="output").inc(output_tokens)
+
+
+@contextmanager
+def track_request(endpoint: str):
+    """
+    Counts a generate request as in progress and records its latency and outcome.
+    """
+    gauge = REQUESTS_IN_PROGRESS.labels(endpoint=endpoint)
+    gauge.inc()
+    start = time.perf_counter()
+    status = "error"
+    try:
+        yield
+        status = "ok"
+    finally:
+        gauge.dec()
+        REQUEST_SECONDS.labels(endpoint=endpoint, status=status).observe(
+            time.perf_counter() - start
+        )
+
+
+def render():
+    """
+    (payload, content type) of the current metrics, across workers in multiprocess mode.
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def reset_multiprocess_dir():
+    """
+    Empties PROMETHEUS_MULTIPROC_DIR before the workers start, so samples from a
+    previous run are not reported.
+    """
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return
+    shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+
+def mark_worker_dead(pid: int):
+    """
+    Drops a dead worker's in-progress gauge samples; its counters and histograms stay.
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid, PROMETHEUS_MULTIPROC_DIR)
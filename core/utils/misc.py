@@ -1,2 +1,26 @@
+import os
+import resource
+
+
 def get_file_type_from_file_key(file_key: str) -> str:
     return file_key.lower().split(".")[-1]
+
+
+def get_process_rss_bytes() -> int:
+    """
+    Current resident set size of this process, in bytes.
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # No procfs (e.g. macOS): fall back to the peak RSS
+        return get_peak_rss_bytes()
+
+
+def get_peak_rss_bytes() -> int:
+    """
+    Peak resident set size of this process, in bytes.
+    """
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+
+class Stage:
+    """
+    One step of a pipeline: an async callable plus the names of the stages it consumes.
+
+    `fn` is called with the result of each dependency as a keyword argument named after
+    that dependency, e.g. Stage("clean", clean, deps=["extract"]) calls clean(extract=...).
+    """
+
+    def __init__(self, name: str, fn, deps=()):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+
+
+async def run_stages(stages: list):
+    """
+    Runs a dependency graph of stages, each as soon as its dependencies are done.
+
+    Returns (results, timings): the result of every stage by name, and per-stage
+    {"start": ..., "duration": ...} in seconds relative to the start of the run, so the
+    critical path can be read off directly.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        for dep in stage.deps:
+            if dep not in by_name:
+                raise ValueError(f"Stage {stage.name} depends on unknown stage {dep}")
+
+    origin = time.perf_counter()
+    tasks = {}
+    timings = {}
+
+    async def run(stage):
+        kwargs = {}
+        for dep in stage.deps:
+            kwargs[dep] = await tasks[dep]
+        start = time.perf_counter()
+        try:
+            return await stage.fn(**kwargs)
+        finally:
+            timings[stage.name] = {
+                "start": start - origin,
+                "duration": time.perf_counter() - start,
+            }
+
+    # Create every task before any of them runs so dependencies can be awaited by name
+    for stage in stages:
+        tasks[stage.name] = asyncio.ensure_future(run(stage))
+
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+
+    results = {name: task.result() for name, task in tasks.items()}
+    return results, timings
+
+
+def format_server_timing(timings: dict) -> str:
+    """
+    Renders stage timings as a Server-Timing header value (durations in milliseconds).
+    """
+    return ", ".join(
+        f"{name};dur={timing['duration'] * 1000:.1f}"
+        for name, timing in timings.items()
+    )
@@ -0,0 +1,100 @@
+import os
+import sys
+import threading
+from collections import Counter
+
+# Sample every thread's stack in the background; GET /debug/profile/ returns the counts
+PROFILER_ENABLED = os.environ.get("PROFILER_ENABLED", "0") == "1"
+
+# Milliseconds between samples
+PROFILER_INTERVAL_MS = float(os.environ.get("PROFILER_INTERVAL_MS", "10"))
+
+# Distinct stacks kept; rarer ones are dropped beyond this many
+PROFILER_MAX_STACKS = int(os.environ.get("PROFILER_MAX_STACKS", "20000"))
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for a live server: a daemon thread snapshots the stack of
+    every other thread each `interval_ms` and counts identical stacks.
+
+    It never instruments the code it samples, so the request path runs at full speed;
+    the cost is one sys._current_frames() call per interval. folded() renders the
+    counts in the collapsed-stack format read by flamegraph.pl and speedscope.
+    """
+
+    def __init__(
+        self,
+        interval_ms: float = PROFILER_INTERVAL_MS,
+        max_stacks: int = PROFILER_MAX_STACKS,
+    ):
+        self.interval = interval_ms / 1000
+        self.max_stacks = max_stacks
+        self.samples = 0
+        self._stacks = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self._add(";".join(reversed(stack)))
+
+    def _add(self, stack):
+        with self._lock:
+            self.samples += 1
+            self._stacks[stack] += 1
+            if len(self._stacks) > self.max_stacks:
+                # Keep the hot paths: drop the stacks seen least often
+                for stack, _ in self._stacks.most_common()[self.max_stacks // 2 :]:
+                    del self._stacks[stack]
+
+    def folded(self, reset: bool = False) -> str:
+        """
+        One "thread;outer;...;inner count" line per distinct stack, hottest first.
+        """
+        with self._lock:
+            lines = [f"{stack} {count}" for stack, count in self._stacks.most_common()]
+            if reset:
+                self._stacks.clear()
+                self.samples = 0
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+profiler = SamplingProfiler()
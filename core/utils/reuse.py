@@ -0,0 +1,79 @@
+import hashlib
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from core.utils.cache import ResultCache
+
+# Intermediate results are kept this long (seconds); a revised RFP reuses those of its
+# unchanged sections
+INTERMEDIATE_CACHE_TTL = int(
+    os.environ.get("INTERMEDIATE_CACHE_TTL", str(7 * 24 * 3600))
+)
+
+# Page texts, embeddings, chunk summaries and window logits by content hash,
+# in-process LRU in front of Redis (bound at startup)
+intermediate_cache = ResultCache(
+    name="intermediate",
+    max_local_entries=int(os.environ.get("INTERMEDIATE_CACHE_LOCAL_ENTRIES", "2048")),
+    ttl=INTERMEDIATE_CACHE_TTL,
+)
+
+
+def content_key(kind: str, version: str, *parts) -> str:
+    """
+    intermediate_cache key for the result of `kind` computed by `version` over `parts`.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return ResultCache.make_key(kind, version, digest.hexdigest())
+
+
+class ReuseReport:
+    """
+    How many units of each kind of intermediate work (pages, windows, ...) one request
+    took from the cache and how many it computed.
+    """
+
+    def __init__(self):
+        self.counts = {}
+
+    def record(self, kind: str, reused: int = 0, computed: int = 0):
+        counts = self.counts.setdefault(kind, {"reused": 0, "computed": 0})
+        counts["reused"] += reused
+        counts["computed"] += computed
+
+    def as_dict(self):
+        report = {}
+        for kind, counts in self.counts.items():
+            total = counts["reused"] + counts["computed"]
+            report[kind] = dict(
+                counts, share_reused=round(counts["reused"] / total, 3) if total else 0
+            )
+        return report
+
+
+# Report of the request being handled, if it asked for one
+_current_report = ContextVar("reuse_report", default=None)
+
+
+@contextmanager
+def track_reuse():
+    """
+    Collects the reuse recorded by the pipeline code run inside the block, including
+    tasks it starts.
+    """
+    report = ReuseReport()
+    token = _current_report.set(report)
+    try:
+        yield report
+    finally:
+        _current_report.reset(token)
+
+
+def record_reuse(kind: str, reused: int = 0, computed: int = 0):
+    report = _current_report.get()
+    if report is not None:
+        report.record(kind, reused, computed)
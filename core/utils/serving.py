@@ -0,0 +1,59 @@
+import os
+
+# Process and thread layout of a serving pod, configured here and nowhere else.
+#
+# main.py forks WEB_WORKERS uvicorn workers from one master process. Each worker gets an
+# equal share of the pod's cores for torch's intra-op threads and its document parsing
+# processes, so together the workers use every core without oversubscribing them.
+
+
+def available_cpus() -> int:
+    """
+    Cores this process may run on (the container's CPU set, not the host's).
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+# uvicorn worker processes sharing the listening socket and the model weights
+WEB_WORKERS = max(int(os.environ.get("WEB_WORKERS", "1")), 1)
+
+# Cores per worker process
+WORKER_CPUS = max(available_cpus() // WEB_WORKERS, 1)
+
+# torch intra-op threads per worker process
+TORCH_THREADS = int(os.environ.get("TORCH_THREADS", str(WORKER_CPUS)))
+
+# Executor pools per worker process (see core/utils/executors.py). torch already
+# parallelises a single forward pass across cores, so inference defaults to one thread;
+# parsing is CPU-bound pure Python and runs in separate processes.
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "1"))
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", str(WORKER_CPUS)))
+IO_WORKERS = int(os.environ.get("IO_WORKERS", "16"))
+
+# Move the model weights into shared memory before forking instead of relying on
+# copy-on-write alone; needs a /dev/shm larger than the weights
+SHARE_MODEL_MEMORY = os.environ.get("SHARE_MODEL_MEMORY", "0") == "1"
+
+HOST = os.environ.get("HOST", "0.0.0.0")
+PORT = int(os.environ.get("PORT", "8080"))
+
+
+def configure_torch(threads: int = TORCH_THREADS):
+    import torch
+
+    torch.set_num_threads(threads)
+
+
+def layout() -> dict:
+    return {
+        "pid": os.getpid(),
+        "web_workers": WEB_WORKERS,
+        "worker_cpus": WORKER_CPUS,
+        "torch_threads": TORCH_THREADS,
+        "inference_workers": INFERENCE_WORKERS,
+        "parse_workers": PARSE_WORKERS,
+        "io_workers": IO_WORKERS,
+        "share_model_memory": SHARE_MODEL_MEMORY,
+    }
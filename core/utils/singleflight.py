@@ -0,0 +1,36 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Shares one run of a coroutine between concurrent callers asking for the same key.
+
+    The first caller's run is started as a task of its own, so a caller that goes away
+    (a client disconnect cancelling its request) neither cancels the run for the others
+    nor hands them its CancelledError. An exception from the run reaches every caller
+    still waiting.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+
+    def __contains__(self, key):
+        return key in self._tasks
+
+    async def do(self, key, run):
+        """
+        Awaits `run()`, or the run already in flight for `key`.
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(run())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            # Callers re-raise it; don't warn if they have all gone
+            task.exception()
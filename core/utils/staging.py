@@ -0,0 +1,153 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+
+from fastapi import UploadFile
+
+from core.utils.document_cache import document_cache
+from core.utils.executors import run_io
+
+# Uploads up to this size are parsed straight from memory; larger ones are spooled to
+# a temporary file once, while they are hashed
+UPLOAD_MEMORY_MAX_BYTES = int(
+    os.environ.get("UPLOAD_MEMORY_MAX_BYTES", str(8 * 1024 * 1024))
+)
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class StagedDocument:
+    """
+    One RFP ready for parsing: its file name, the SHA-256 of its content, and the
+    content itself, either in memory (`data`) or in a file on local disk (`path`).
+
+    Every parser reads the same staged content, without copying it to disk first; only
+    work split across the parse pool has an in-memory document written out (spool).
+    """
+
+    def __init__(self, name, digest, data=None, path=None, temp_dir=None):
+        self.name = os.path.basename(name)
+        self.digest = digest
+        self.data = data
+        self.path = path
+        # Removed by close(), with the spooled or linked file in it
+        self.temp_dir = temp_dir
+        self._spool_lock = threading.Lock()
+
+    @property
+    def extension(self):
+        return os.path.splitext(self.name)[-1].lower()
+
+    @property
+    def content(self):
+        """
+        The bytes when the document is in memory, else its path. Both pickle to the
+        parse pool; open them with open_content, or pass them to LlamaParse as is.
+        """
+        return self.data if self.data is not None else self.path
+
+    def spool(self) -> str:
+        """
+        Path of the document on local disk, writing an in-memory one to a temporary
+        directory first, once. Tasks in the parse pool given the path open the file
+        themselves instead of each being sent a copy of the bytes.
+        """
+        with self._spool_lock:
+            if self.path is None:
+                self.temp_dir = tempfile.mkdtemp()
+                self.path = os.path.join(self.temp_dir, self.name)
+                with open(self.path, "wb") as f:
+                    f.write(self.data)
+            return self.path
+
+    def close(self):
+        if self.temp_dir is not None:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+            self.temp_dir = None
+
+
+def open_content(content):
+    """
+    A binary file object over StagedDocument.content, for parsers that take a stream.
+    """
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        return io.BytesIO(content)
+    return open(content, "rb")
+
+
+def documents_digest(documents: list) -> str:
+    """
+    Content hash of a set of documents; for one document, the SHA-256 of its bytes.
+    """
+    if len(documents) == 1:
+        return documents[0].digest
+    digest = hashlib.sha256()
+    for document in documents:
+        digest.update(document.digest.encode("utf-8"))
+    return digest.hexdigest()
+
+
+async def stage_upload(
+    file: UploadFile, max_memory: int = UPLOAD_MEMORY_MAX_BYTES
+) -> StagedDocument:
+    """
+    Reads an upload once, hashing it as it streams in.
+
+    Uploads up to `max_memory` bytes stay in memory and are parsed from there, with no
+    temporary files; larger ones are written to a temporary directory on the way.
+    """
+    digest = hashlib.sha256()
+    chunks = []
+    size = 0
+    spool = None
+    temp_dir = None
+
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+
+            if spool is None and size > max_memory:
+                temp_dir = tempfile.mkdtemp()
+                path = os.path.join(temp_dir, os.path.basename(file.filename))
+                spool = await run_io(open, path, "wb")
+                await run_io(spool.writelines, chunks)
+                chunks = None
+            if spool is not None:
+                await run_io(spool.write, chunk)
+            else:
+                chunks.append(chunk)
+    except Exception:
+        if spool is not None:
+            spool.close()
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+
+    if spool is None:
+        return StagedDocument(file.filename, digest.hexdigest(), data=b"".join(chunks))
+
+    await run_io(spool.close)
+    return StagedDocument(
+        file.filename, digest.hexdigest(), path=spool.name, temp_dir=temp_dir
+    )
+
+
+async def stage_file_key(file_key: str) -> StagedDocument:
+    """
+    Stages a previously uploaded S3 object through the local document cache, so
+    repeat generations skip the download.
+    """
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path, digest = await document_cache.fetch(file_key, temp_dir)
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    return StagedDocument(file_key, digest, path=path, temp_dir=temp_dir)
@@ -0,0 +1,59 @@
+import importlib
+import sys
+import time
+from contextlib import contextmanager
+
+
+class StartupReport:
+    """
+    Where a process's cold start went: when it reached each milestone, how long each
+    startup phase took, and how long each heavy library took to import.
+
+    Times are seconds; milestones are relative to the import of this module, which the
+    server imports before anything else.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.milestones = {}
+        self.phases = {}
+        self.imports = {}
+
+    def mark(self, milestone: str):
+        self.milestones[milestone] = time.perf_counter() - self.origin
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+
+    def import_module(self, name: str):
+        """
+        Imports `name`, recording how long it took unless it was already imported.
+        """
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        self.imports[name] = time.perf_counter() - start
+        return module
+
+    def as_dict(self):
+        def rounded(times):
+            return {name: round(seconds, 3) for name, seconds in times.items()}
+
+        return {
+            "milestones": rounded(self.milestones),
+            "phases": rounded(self.phases),
+            # Slowest first
+            "imports": rounded(
+                dict(sorted(self.imports.items(), key=lambda item: -item[1]))
+            ),
+        }
+
+
+startup = StartupReport()
@@ -1,23 +1,207 @@
 from fastapi import UploadFile
-import boto3
+import asyncio
+import hashlib
+import os
+import threading
+import uuid
 
-S3_BUCKET = "von-rfps"
-s3_client = boto3.client("s3")
+from core.utils.executors import run_io
 
+S3_BUCKET = os.environ.get("S3_BUCKET", "von-rfps")
 
-async def upload_file_to_s3(file: UploadFile) -> str:
+# Point at a local S3 stand-in (MinIO, moto server) for development and tests
+S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL") or None
+
+# Pooled HTTP connections shared by every S3 call in the process
+S3_MAX_POOL_CONNECTIONS = int(os.environ.get("S3_MAX_POOL_CONNECTIONS", "32"))
+
+# Uploads are sent in parts of this size (S3's minimum is 5 MiB); smaller files go in one request
+S3_PART_SIZE = max(int(os.environ.get("S3_PART_SIZE", str(8 * 1024**2))), 5 * 1024**2)
+
+# Parts of one upload in flight at once, which also bounds its memory to this many parts
+S3_UPLOAD_CONCURRENCY = int(os.environ.get("S3_UPLOAD_CONCURRENCY", "4"))
+
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """
+    The process's S3 client, created on first use so that importing boto3 and building
+    the client is not part of server start.
+
+    boto3 clients are thread-safe, so one pooled client serves all of the I/O pool.
+    """
+    global _s3_client
+    with _s3_client_lock:
+        if _s3_client is None:
+            import boto3
+            from botocore.config import Config
+
+            _s3_client = boto3.client(
+                "s3",
+                endpoint_url=S3_ENDPOINT_URL,
+                config=Config(
+                    max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                    retries={"max_attempts": 5, "mode": "adaptive"},
+                ),
+            )
+        return _s3_client
+
+
+def reset_s3_client():
+    """
+    Forgets the S3 client in a process forked from the one that created it, so that it
+    creates its own: boto3 clients are not fork-safe, and the child would otherwise
+    share the parent's pooled connections.
+    """
+    global _s3_client, _s3_client_lock
+    # Another thread of the parent may have held the lock when it forked
+    _s3_client_lock = threading.Lock()
+    _s3_client = None
+
+
+def content_key(prefix: str, digest: str, filename: str) -> str:
+    """
+    Key of an uploaded document: identical uploads land on the same object.
+    """
+    return f"{prefix}/{digest}/{os.path.basename(filename)}"
+
+
+def object_exists(file_key: str) -> bool:
+    try:
+        get_s3_client().head_object(Bucket=S3_BUCKET, Key=file_key)
+        return True
+    except get_s3_client().exceptions.ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+
+async def upload_file_to_s3(file: UploadFile, prefix: str = "rfps") -> str:
     """
     Upload a file to S3 bucket.
+
+    The file is streamed in S3_PART_SIZE parts, up to S3_UPLOAD_CONCURRENCY of them in
+    flight, so memory stays bounded however large the upload is. The key includes the
+    SHA-256 of the content (see content_key); since that is only known at the end, a
+    multipart upload goes to a temporary key and is copied into place server-side.
     """
+    digest = hashlib.sha256()
+    first_part = await file.read(S3_PART_SIZE)
+    digest.update(first_part)
+
+    if len(first_part) < S3_PART_SIZE:
+        # Fits in one part: a single request straight to the final key
+        file_key = content_key(prefix, digest.hexdigest(), file.filename)
+        await run_io(
+            get_s3_client().put_object, Bucket=S3_BUCKET, Key=file_key, Body=first_part
+        )
+        return file_key
+
+    tmp_key = f"{prefix}/tmp-{uuid.uuid4().hex}/{os.path.basename(file.filename)}"
+    upload = await run_io(
+        get_s3_client().create_multipart_upload, Bucket=S3_BUCKET, Key=tmp_key
+    )
+    upload_id = upload["UploadId"]
 
-    file_content = await file.read()
-    file_key = f"rfps/{file.filename}"
-    s3_client.put_object(Bucket=S3_BUCKET, Key=file_key, Body=file_content)
+    slots = asyncio.Semaphore(S3_UPLOAD_CONCURRENCY)
+    tasks = []
+
+    async def upload_part(part_number, body):
+        try:
+            response = await run_io(
+                get_s3_client().upload_part,
+                Bucket=S3_BUCKET,
+                Key=tmp_key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=body,
+            )
+            return {"PartNumber": part_number, "ETag": response["ETag"]}
+        finally:
+            slots.release()
+
+    try:
+        part, part_number = first_part, 1
+        while part:
+            # Wait for a free slot before reading the next part into memory
+            await slots.acquire()
+            tasks.append(asyncio.ensure_future(upload_part(part_number, part)))
+            part = await file.read(S3_PART_SIZE)
+            digest.update(part)
+            part_number += 1
+
+        parts = await asyncio.gather(*tasks)
+        await run_io(
+            get_s3_client().complete_multipart_upload,
+            Bucket=S3_BUCKET,
+            Key=tmp_key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await run_io(
+            get_s3_client().abort_multipart_upload,
+            Bucket=S3_BUCKET,
+            Key=tmp_key,
+            UploadId=upload_id,
+        )
+        raise
+
+    file_key = content_key(prefix, digest.hexdigest(), file.filename)
+    try:
+        if not await run_io(object_exists, file_key):
+            # Managed copy, multipart itself for objects over 5 GB
+            await run_io(
+                get_s3_client().copy,
+                {"Bucket": S3_BUCKET, "Key": tmp_key},
+                S3_BUCKET,
+                file_key,
+            )
+    finally:
+        await run_io(get_s3_client().delete_object, Bucket=S3_BUCKET, Key=tmp_key)
 
     return file_key
 
 
+def delete_prefix(prefix: str):
+    """
+    Deletes every object under `prefix`, a page (up to 1000 keys) per request.
+    """
+    paginator = get_s3_client().get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=S3_BUCKET, Prefix=prefix):
+        objects = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+        if objects:
+            get_s3_client().delete_objects(
+                Bucket=S3_BUCKET, Delete={"Objects": objects, "Quiet": True}
+            )
+
+
 async def download_file_from_s3(file_key: str) -> bytes:
-    response = s3_client.get_object(Bucket=S3_BUCKET, Key=file_key)
-    file_contents = response["Body"].read()
-    return file_contents
\ No newline at end of file
+    def download():
+        response = get_s3_client().get_object(Bucket=S3_BUCKET, Key=file_key)
+        return response["Body"].read()
+
+    return await run_io(download)
+
+
+async def download_file_from_s3_to_path(
+    file_key: str, path: str, chunk_size: int = 1024 * 1024
+) -> str:
+    """
+    Streams an object to `path` in chunks, returning the SHA-256 of its content.
+    """
+
+    def download():
+        digest = hashlib.sha256()
+        response = get_s3_client().get_object(Bucket=S3_BUCKET, Key=file_key)
+        with open(path, "wb") as f:
+            for chunk in response["Body"].iter_chunks(chunk_size):
+                f.write(chunk)
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    return await run_io(download)
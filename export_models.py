@@ -0,0 +1,135 @@
+"""
+Offline export of the CPU serving artefacts.
+
+Merges the summariser's LoRA adapter into the BART weights and writes dynamically
+quantised int8 copies of both models (and optionally an ONNX export of the compliance
+classifier) to the paths configured under `runtime:` in each service's config.yaml.
+Point `runtime.backend` at the artefact to serve it:
+
+    python export_models.py                 # merged + int8 for both models
+    python export_models.py --onnx          # also export the compliance classifier to ONNX
+
+Each artefact directory gets a manifest.json of file checksums; upload it with the
+files (e.g. `aws s3 sync models/compliance_model_int8 s3://rfp-models/compliance_model_int8`)
+so pods can verify their download.
+"""
+
+import argparse
+import os
+import shutil
+
+import torch
+from transformers import (
+    BartForConditionalGeneration,
+    BartTokenizer,
+    BertForSequenceClassification,
+    BertTokenizer,
+)
+
+from app.services.backends import ONNX_MODEL, save_int8
+from app.services.generate_compliance.compliance_model import (
+    config as compliance_config,
+    label_map,
+)
+from app.services.generate_proposal.summarization_model import (
+    config as summarization_config,
+    load_fine_tuned_bart,
+)
+from core.utils.artifacts import fetch_artifact, write_manifest
+
+
+def replace_directory(build_dir, out_dir):
+    # Swap in the new artefact only once it is complete
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.rename(build_dir, out_dir)
+
+
+def export_summarizer():
+    model_path = summarization_config["model"]["model_path"]
+    runtime = summarization_config["runtime"]
+
+    fetch_artifact("summarization_model_fine_tuned", model_path)
+
+    model = load_fine_tuned_bart(model_path).eval()
+    tokenizer = BartTokenizer.from_pretrained(model_path)
+
+    build_dir = runtime["merged_path"] + ".build"
+    model.save_pretrained(build_dir)
+    tokenizer.save_pretrained(build_dir)
+    write_manifest(build_dir)
+    replace_directory(build_dir, runtime["merged_path"])
+    print(f"Wrote merged summariser to {runtime['merged_path']}")
+
+    # Quantise from the merged weights so the adapter is folded in before rounding
+    merged = BartForConditionalGeneration.from_pretrained(runtime["merged_path"])
+    build_dir = runtime["int8_path"] + ".build"
+    save_int8(merged, tokenizer, build_dir)
+    write_manifest(build_dir)
+    replace_directory(build_dir, runtime["int8_path"])
+    print(f"Wrote int8 summariser to {runtime['int8_path']}")
+
+
+def export_compliance(onnx=False):
+    model_path = compliance_config["model"]["model_path"]
+    runtime = compliance_config["runtime"]
+
+    fetch_artifact("compliance_model_fine_tuned", model_path)
+
+    model = BertForSequenceClassification.from_pretrained(
+        model_path, num_labels=len(label_map), use_safetensors=True
+    ).eval()
+    tokenizer = BertTokenizer.from_pretrained(model_path)
+
+    build_dir = runtime["int8_path"] + ".build"
+    save_int8(model, tokenizer, build_dir)
+    write_manifest(build_dir)
+    replace_directory(build_dir, runtime["int8_path"])
+    print(f"Wrote int8 compliance model to {runtime['int8_path']}")
+
+    if not onnx:
+        return
+
+    build_dir = runtime["onnx_path"] + ".build"
+    os.makedirs(build_dir, exist_ok=True)
+    sample = tokenizer(["Export sample."], return_tensors="pt")
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in names}
+    dynamic_axes["logits"] = {0: "batch"}
+    torch.onnx.export(
+        model,
+        tuple(sample[name] for name in names),
+        os.path.join(build_dir, ONNX_MODEL),
+        input_names=names,
+        output_names=["logits"],
+        dynamic_axes=dynamic_axes,
+        opset_version=17,
+        dynamo=False,
+    )
+    model.config.save_pretrained(build_dir)
+    tokenizer.save_pretrained(build_dir)
+    write_manifest(build_dir)
+    replace_directory(build_dir, runtime["onnx_path"])
+    print(f"Wrote ONNX compliance model to {runtime['onnx_path']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        default=["summarization", "compliance"],
+        choices=["summarization", "compliance"],
+    )
+    parser.add_argument(
+        "--onnx", action="store_true", help="also export the compliance model to ONNX"
+    )
+    args = parser.parse_args()
+
+    if "summarization" in args.models:
+        export_summarizer()
+    if "compliance" in args.models:
+        export_compliance(onnx=args.onnx)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+Downloads the model artefacts for the configured runtime backends and exits.
+
+Run it as an init container (same image, `python fetch_models.py`) on a volume shared
+with the serving container, so pods start with complete, verified models on disk and
+the server only has to load them. Exits non-zero if any artefact could not be fetched.
+"""
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.model_registry import registry
+
+
+def fetch(item):
+    name, factory = item
+    start = time.perf_counter()
+    try:
+        path = factory().fetch(verify=True)
+    except Exception as e:
+        print(f"Error downloading {name} model: {e}")
+        return False
+    print(f"{name}: {path} ready in {time.perf_counter() - start:.1f}s")
+    return True
+
+
+def main():
+    with ThreadPoolExecutor(max_workers=len(registry.factories)) as pool:
+        fetched = list(pool.map(fetch, registry.factories.items()))
+    return 0 if all(fetched) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
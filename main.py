@@ -1,4 +1,134 @@
+"""
+Starts the API server.
+
+With WEB_WORKERS=1 (the default) this is a single uvicorn process. With more, a master
+process loads the models once and then forks the workers, which share the listening
+socket and the model weights copy-on-write, so memory does not grow with the worker
+count. The master restarts workers that die and stops them all on SIGTERM. The thread
+layout of every worker is set in core/utils/serving.py. Set PROMETHEUS_MULTIPROC_DIR
+so /metrics reports all the workers together.
+"""
+
+import gc
+import os
+import signal
+import time
+
 import uvicorn
 
+from core.utils import metrics, serving, storage
+
+APP = "app.server:app"
+
+
+def serve_single():
+    serving.configure_torch()
+    uvicorn.run(APP, host=serving.HOST, port=serving.PORT)
+
+
+def load_shared_models():
+    """
+    Imports the app and loads the models in the master, before any worker is forked.
+    """
+    # Imported here so the import itself happens once, in the master, along with the
+    # libraries the server otherwise imports after startup
+    import app.server
+    from app.services.model_registry import registry
+
+    app.server.import_pipeline_modules()
+
+    # Load and warm up on one thread: fork copies no torch/OpenMP thread pool, so
+    # none is left broken in the workers
+    serving.configure_torch(1)
+    registry.load()
+    if serving.SHARE_MODEL_MEMORY:
+        registry.share_memory()
+
+    # Keep the garbage collector from writing to (and so copying) every shared object
+    gc.collect()
+    gc.freeze()
+
+
+def run_worker(config: uvicorn.Config, sock):
+    from app.services.model_registry import registry
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    # The master fetched the models with its own S3 client; Redis is connected in each
+    # worker's startup hook, after the fork
+    storage.reset_s3_client()
+
+    serving.configure_torch()
+    # Starts this worker's own torch thread pool before the first request does
+    registry.warmup()
+
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def serve_prefork():
+    config = uvicorn.Config(APP, host=serving.HOST, port=serving.PORT)
+    sock = config.bind_socket()
+    metrics.reset_multiprocess_dir()
+
+    start = time.perf_counter()
+    load_shared_models()
+    print(
+        f"Models loaded in {time.perf_counter() - start:.1f}s; layout {serving.layout()}"
+    )
+
+    workers = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(config, sock)
+            except BaseException as e:
+                print(f"Worker {os.getpid()} failed: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        workers.add(pid)
+        print(f"Started worker {pid}")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(serving.WEB_WORKERS):
+        spawn()
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        workers.discard(pid)
+        metrics.mark_worker_dead(pid)
+        if stopping:
+            continue
+        print(f"Worker {pid} exited with status {status}; restarting it")
+        # Don't spin if workers die as soon as they start
+        time.sleep(1)
+        if not stopping:
+            spawn()
+
+    sock.close()
+
+
 if __name__ == "__main__":
-    uvicorn.run("app.server:app", host="0.0.0.0", port=8080)
+    if serving.WEB_WORKERS > 1:
+        serve_prefork()
+    else:
+        serve_single()
@@ -0,0 +1,129 @@
+import aioredis
+import asyncio
+import os
+import signal
+import traceback
+
+from prometheus_client import start_http_server
+
+from app.services.model_registry import registry
+from app.services.reports import build_compliance_report, build_proposal, result_cache
+from core.utils import executors
+from core.utils.executors import run_inference, run_io
+from core.utils.jobs import JobQueue
+from core.utils.llm_cache import llm_cache
+from core.utils.reuse import intermediate_cache
+from core.utils.serving import configure_torch
+from core.utils.staging import stage_file_key
+from core.utils.storage import delete_prefix
+
+REDIS_URL = os.environ.get("REDIS_URL", "redis://redis-service:6379")
+
+# Jobs processed at once by this worker process
+WORKER_CONCURRENCY = int(os.environ.get("WORKER_CONCURRENCY", "2"))
+
+# A job running longer than this is assumed lost and handed to another worker
+JOB_VISIBILITY_TIMEOUT = int(os.environ.get("JOB_VISIBILITY_TIMEOUT", "1800"))
+
+# Serve the pipeline metrics (see core/utils/metrics.py) on this port; 0 disables
+WORKER_METRICS_PORT = int(os.environ.get("WORKER_METRICS_PORT", "0"))
+
+
+async def run_job(job):
+    payload = job["payload"]
+    file_extension = os.path.splitext(payload["filename"])[-1].lower()
+
+    document = await stage_file_key(payload["file_key"])
+    try:
+        if job["kind"] == "proposal":
+            proposal, _ = await build_proposal([document], file_extension)
+            return proposal
+        if job["kind"] == "compliance":
+            return await build_compliance_report([document], file_extension)
+        raise ValueError(f"Unknown job kind: {job['kind']}")
+    finally:
+        document.close()
+
+
+async def delete_upload(job_id):
+    """
+    Deletes the document uploaded for a job that will not run again.
+    """
+    try:
+        await run_io(delete_prefix, JobQueue.upload_prefix(job_id) + "/")
+    except Exception as e:
+        print(f"Error deleting the upload of job {job_id}: {e}")
+
+
+async def consume(queue: JobQueue, stopping: asyncio.Event):
+    while not stopping.is_set():
+        job = await queue.claim(timeout=1)
+        if job is None:
+            continue
+
+        print(f"Running {job['kind']} job {job['id']} (attempt {job['attempts']})")
+        try:
+            result = await run_job(job)
+        except Exception as e:
+            traceback.print_exc()
+            retry = await queue.fail(job["id"], str(e))
+            print(f"Job {job['id']} failed{', retrying' if retry else ''}: {e}")
+            if not retry:
+                await delete_upload(job["id"])
+        else:
+            await queue.complete(job["id"], result)
+            print(f"Job {job['id']} succeeded")
+            await delete_upload(job["id"])
+
+
+async def requeue_stale(queue: JobQueue, stopping: asyncio.Event):
+    while not stopping.is_set():
+        stale = await queue.requeue_stale(JOB_VISIBILITY_TIMEOUT)
+        if stale:
+            print(
+                "Re-queued stale jobs: "
+                + ", ".join(f"{job_id} ({status})" for job_id, status in stale.items())
+            )
+        for job_id, status in stale.items():
+            if status == "failed":
+                await delete_upload(job_id)
+        try:
+            await asyncio.wait_for(stopping.wait(), timeout=60)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def main():
+    redis = await aioredis.from_url(REDIS_URL)
+    result_cache.redis = redis
+    llm_cache.redis = redis
+    intermediate_cache.redis = redis
+    queue = JobQueue(redis)
+
+    if WORKER_METRICS_PORT:
+        start_http_server(WORKER_METRICS_PORT)
+
+    configure_torch()
+    await run_inference(registry.load)
+    if not registry.ready:
+        print("Models failed to load; continuing so failed jobs are reported.")
+
+    # Finish the jobs in hand on SIGTERM instead of dropping them mid-run
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    print(f"Worker started with concurrency {WORKER_CONCURRENCY}")
+    try:
+        await asyncio.gather(
+            requeue_stale(queue, stopping),
+            *[consume(queue, stopping) for _ in range(WORKER_CONCURRENCY)],
+        )
+    finally:
+        await redis.close()
+        executors.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())